@@ -5,35 +5,155 @@
 # file that should have been included as part of this package.
 
 
+import asyncio
+import json
 import os
-from datetime import datetime
+import zipfile
+from collections import Counter
 from pathlib import Path
 from uuid import uuid4
 
 import celery.states as states
-from celery import Celery
-from fastapi import BackgroundTasks, FastAPI, File, Request, UploadFile
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
-from typing import Optional, Dict
+import redis
+from celery import Celery, chord
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Dict, List, Tuple
 
-UPLOAD_FOLDER = Path("/tmp/genea_visualizer")
+from batch import ARCHIVE_ERRORS, BatchError, extract_member, read_manifest
+from render_cache import RenderCache
+from responses import file_response
+from upload_stream import MultipartUpload, StagedUpload, UploadError
+from shared.bvh_validation import BvhValidator
+from shared.file_registry import FileRegistry
+from shared.lanes import SHORT_LANE, choose_lane, estimate_cost
+from shared.progress import progress_channel
+from shared.queue_index import QueueIndex
+from shared.storage import storage_from_env
+
+UPLOAD_FOLDER = Path(os.environ.get("UPLOAD_FOLDER", "/tmp/genea_visualizer"))
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 
+# room for the multipart boundaries, part headers and small form fields
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_BVH_FILE_SIZE = int(os.environ.get("MAX_BVH_FILE_SIZE", 64 * 1024 * 1024))
+MAX_AUDIO_FILE_SIZE = int(os.environ.get("MAX_AUDIO_FILE_SIZE", 128 * 1024 * 1024))
+MAX_VIDEO_FILE_SIZE = int(os.environ.get("MAX_VIDEO_FILE_SIZE", 1024 * 1024 * 1024))
+MAX_BATCH_FILE_SIZE = int(os.environ.get("MAX_BATCH_FILE_SIZE", 2 * 1024 * 1024 * 1024))
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", 100))
+
+PROGRESS_POLL_INTERVAL = 0.25
+PROGRESS_KEEPALIVE = float(os.environ.get("PROGRESS_KEEPALIVE", 15))
+
+TMP_SWEEP_INTERVAL = int(os.environ.get("TMP_SWEEP_INTERVAL", 60))
+
+LANE_SHORT_MAX_COST = float(os.environ.get("LANE_SHORT_MAX_COST", 900))
+LANE_AUDIO_COST_FACTOR = float(os.environ.get("LANE_AUDIO_COST_FACTOR", 1.2))
+
 
 celery_workers = Celery(
 	"tasks",
 	broker=os.environ["CELERY_BROKER_URL"],
 	backend=os.environ["CELERY_RESULT_BACKEND"],
 )
+celery_workers.conf.task_default_queue = SHORT_LANE
+
+redis_client = redis.Redis.from_url(os.environ["REDIS_URL"])
+
+storage = storage_from_env()
+
+file_registry = FileRegistry(
+	redis_client,
+	storage,
+	int(os.environ.get("TMP_FILE_RETENTION", 24 * 60 * 60)),
+	int(os.environ.get("TMP_FOLDER_MAX_BYTES", 0)),
+)
+
+# a job still waiting when its uploads expire can not render any more
+queue_index = QueueIndex(redis_client, file_registry.retention)
+
+render_cache = RenderCache(
+	redis_client,
+	storage,
+	int(os.environ.get("RENDER_CACHE_MAX_ENTRIES", 500)),
+)
 
 app = FastAPI()
 
 
-async def save_tmp_file(upload_file) -> str:
-	_, extension = os.path.splitext(upload_file.filename)
-	filename = f"{uuid4()}{extension}"
-	(UPLOAD_FOLDER / filename).write_bytes(upload_file.file.read())
-	return f"/files/{filename}"
+async def receive_upload(request: Request, fields: Dict[str, Tuple[int, Optional[BvhValidator]]], required: List[str]) -> Dict[str, StagedUpload]:
+	# parses the form while the body is received and writes every file field to
+	# the staging folder in bounded chunks, so neither memory use nor the time
+	# until an oversized or malformed upload is rejected grow with the body
+	max_size = sum(max_size for max_size, _ in fields.values()) + MULTIPART_OVERHEAD
+	content_length = request.headers.get("content-length")
+	if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+		raise HTTPException(status_code=413, detail=f"The request body is bigger than {max_size} bytes")
+	try:
+		upload = MultipartUpload(request.headers.get("content-type", ""), UPLOAD_FOLDER, fields)
+	except UploadError as e:
+		raise HTTPException(status_code=e.status_code, detail=str(e))
+	received = 0
+	try:
+		async for chunk in request.stream():
+			# a body without a Content-Length is bounded while it streams
+			received += len(chunk)
+			if received > max_size:
+				raise UploadError(413, f"The request body is bigger than {max_size} bytes")
+			await run_in_threadpool(upload.write, chunk)
+		files = await run_in_threadpool(upload.finish)
+	except UploadError as e:
+		upload.discard()
+		raise HTTPException(status_code=e.status_code, detail=str(e))
+	except BaseException:
+		upload.discard()
+		raise
+	for name in required:
+		if name not in files:
+			upload.discard()
+			raise HTTPException(status_code=422, detail=f"The file field {name} is required")
+	return files
+
+
+async def save_tmp_file(staged: StagedUpload) -> Tuple[str, str]:
+	# hands the staged upload over to the storage and returns its key
+	await run_in_threadpool(storage.put_file, staged.path.name, staged.path)
+	await run_in_threadpool(file_registry.register, staged.path.name, staged.size)
+	return staged.path.name, staged.digest.hexdigest()
+
+
+def save_archive_member(archive: zipfile.ZipFile, member: str, max_size: int, validator: Optional[BvhValidator] = None) -> Tuple[str, str]:
+	_, extension = os.path.splitext(member)
+	file = UPLOAD_FOLDER / f"{uuid4()}{extension.lower()}"
+	size, digest = extract_member(archive, member, file, max_size, validator)
+	storage.put_file(file.name, file)
+	file_registry.register(file.name, size)
+	return file.name, digest
+
+
+def unpack_batch(archive_file: Path) -> List[dict]:
+	items = []
+	try:
+		with zipfile.ZipFile(archive_file) as archive:
+			for name, bvh_member, audio_member in read_manifest(archive, MAX_BATCH_ITEMS):
+				item = {"name": name, "audio_file_key": None, "audio_digest": None}
+				validator = BvhValidator.from_env()
+				item["bvh_file_key"], item["bvh_digest"] = save_archive_member(archive, bvh_member, MAX_BVH_FILE_SIZE, validator)
+				item["nframes"] = validator.nframes
+				# listed before the audio is saved, so a failing audio member does not leak the stored BVH
+				items.append(item)
+				if audio_member is not None:
+					item["audio_file_key"], item["audio_digest"] = save_archive_member(archive, audio_member, MAX_AUDIO_FILE_SIZE)
+	except (BatchError,) + ARCHIVE_ERRORS as e:
+		for item in items:
+			for file_key in [item["bvh_file_key"], item["audio_file_key"]]:
+				if file_key is not None:
+					file_registry.remove(file_key)
+		raise HTTPException(status_code=400, detail=str(e))
+	finally:
+		archive_file.unlink()
+	return items
 
 
 def verify_token(headers, path):
@@ -46,15 +166,27 @@ def verify_token(headers, path):
 		return False
 
 
-async def delete_tmp_file(file: Path):
-	file.unlink()
+def select_lane(headers, nframes: int, has_audio: bool) -> str:
+	is_system = os.environ["SYSTEM_TOKEN"] == headers.get("authorization", "")[7:]
+	cost = estimate_cost(nframes, int(os.environ.get("RENDER_DURATION_FRAMES", -1)), has_audio, LANE_AUDIO_COST_FACTOR)
+	return choose_lane(is_system, cost, LANE_SHORT_MAX_COST)
+
+
+async def delete_tmp_file(key: str):
+	await run_in_threadpool(file_registry.remove, key)
+
 
+async def sweep_tmp_files():
+	while True:
+		# every API process runs this loop, but only one of them sweeps per interval
+		if file_registry.acquire_sweep(TMP_SWEEP_INTERVAL):
+			await run_in_threadpool(file_registry.sweep)
+		await asyncio.sleep(TMP_SWEEP_INTERVAL)
 
-async def remove_old_tmp_files():
-	for file in UPLOAD_FOLDER.glob("*"):
-		time_delta = datetime.now() - datetime.fromtimestamp(os.path.getmtime(file))
-		if time_delta.days > 0:
-			file.unlink()
+
+@app.on_event("startup")
+async def start_tmp_file_sweeper():
+	asyncio.ensure_future(sweep_tmp_files())
 
 
 @app.middleware("http")
@@ -65,44 +197,192 @@ async def authorize(request: Request, call_next):
 
 
 @app.post("/render", response_class=PlainTextResponse)
-async def render(p_rotate: str, visualization_mode: str, background_tasks: BackgroundTasks, bvh_file: UploadFile = File(...), audio_file: Optional[UploadFile] = File(None)):
-	bvh_file_uri = await save_tmp_file(bvh_file)
-	audio_file_uri = None
-	if audio_file is not None:
-		audio_file_uri = await save_tmp_file(audio_file)
-	task = celery_workers.send_task("tasks.render", args=[bvh_file_uri, audio_file_uri, p_rotate, visualization_mode], kwargs={})
-	background_tasks.add_task(remove_old_tmp_files)
+async def render(p_rotate: str, visualization_mode: str, request: Request, background_tasks: BackgroundTasks):
+	# the form is read from the request stream: bvh_file and an optional audio_file
+	validator = BvhValidator.from_env()
+	files = await receive_upload(request, {"bvh_file": (MAX_BVH_FILE_SIZE, validator), "audio_file": (MAX_AUDIO_FILE_SIZE, None)}, ["bvh_file"])
+	bvh_file_key, bvh_digest = await save_tmp_file(files["bvh_file"])
+	audio_file_key, audio_digest = None, None
+	if "audio_file" in files:
+		audio_file_key, audio_digest = await save_tmp_file(files["audio_file"])
+
+	cache_key = render_cache.make_key(bvh_digest, audio_digest, p_rotate, visualization_mode)
+	video_file_key = f"{uuid4()}.mp4"
+	if await run_in_threadpool(render_cache.checkout, cache_key, video_file_key):
+		video_file_size = await run_in_threadpool(storage.size, video_file_key)
+		await run_in_threadpool(file_registry.register, video_file_key, video_file_size)
+		for file_key in [bvh_file_key, audio_file_key]:
+			if file_key is not None:
+				background_tasks.add_task(delete_tmp_file, file_key)
+		task_id = str(uuid4())
+		celery_workers.backend.mark_as_done(task_id, f"/files/{video_file_key}")
+		return f"/jobid/{task_id}"
+
+	task_id = str(uuid4())
+	lane = select_lane(request.headers, validator.nframes, audio_file_key is not None)
+	queue_index.enqueue(task_id, lane)
+	task = celery_workers.send_task("tasks.render", args=[bvh_file_key, audio_file_key, p_rotate, visualization_mode], task_id=task_id, queue=lane)
+	render_cache.remember(task.id, cache_key)
 	return f"/jobid/{task.id}"
 
 
+@app.post("/render_batch", response_class=PlainTextResponse)
+async def render_batch(p_rotate: str, visualization_mode: str, request: Request):
+	files = await receive_upload(request, {"archive_file": (MAX_BATCH_FILE_SIZE, None)}, ["archive_file"])
+	items = await run_in_threadpool(unpack_batch, files["archive_file"].path)
+
+	# clips that were rendered before are taken from the cache, the rest is fanned
+	# out as one chord whose callback packs all videos into a single archive
+	batch_id = str(uuid4())
+	cached_items = []
+	header = []
+	for item in items:
+		cache_key = render_cache.make_key(item["bvh_digest"], item["audio_digest"], p_rotate, visualization_mode)
+		video_file_key = f"{uuid4()}.mp4"
+		if await run_in_threadpool(render_cache.checkout, cache_key, video_file_key):
+			video_file_size = await run_in_threadpool(storage.size, video_file_key)
+			await run_in_threadpool(file_registry.register, video_file_key, video_file_size)
+			cached_items.append([item["name"], f"/files/{video_file_key}"])
+			for file_key in [item["bvh_file_key"], item["audio_file_key"]]:
+				if file_key is not None:
+					await delete_tmp_file(file_key)
+			continue
+		item["task_id"] = str(uuid4())
+		lane = select_lane(request.headers, item["nframes"], item["audio_file_key"] is not None)
+		queue_index.enqueue(item["task_id"], lane)
+		render_cache.remember(item["task_id"], cache_key)
+		header.append(celery_workers.signature(
+			"tasks.render",
+			args=[item["bvh_file_key"], item["audio_file_key"], p_rotate, visualization_mode],
+		).set(task_id=item["task_id"], queue=lane))
+
+	rendered_items = [item for item in items if "task_id" in item]
+	archive_task_id = str(uuid4())
+	archive_args = [[item["name"] for item in rendered_items], cached_items, batch_id]
+	if header:
+		chord(header)(celery_workers.signature("tasks.archive_batch", args=archive_args).set(task_id=archive_task_id))
+	else:
+		celery_workers.send_task("tasks.archive_batch", args=[[]] + archive_args, task_id=archive_task_id)
+
+	redis_client.set(f"batch:{batch_id}", json.dumps({
+		"task_ids": [item["task_id"] for item in rendered_items],
+		"cached": len(cached_items),
+		"archive_task_id": archive_task_id,
+	}), ex=file_registry.retention)
+	return f"/batch/{batch_id}"
+
+
+@app.get("/batch/{batch_id}")
+def check_batch(batch_id: str):
+	batch = redis_client.get(f"batch:{batch_id}")
+	if batch is None:
+		raise HTTPException(status_code=404, detail=f"The batch {batch_id} does not exist")
+	batch = json.loads(batch)
+	task_states = Counter()
+	for task_id in batch["task_ids"]:
+		res = celery_workers.AsyncResult(task_id)
+		task_states[res.state] += 1
+		if res.state == states.SUCCESS:
+			render_cache.store(task_id, os.path.basename(res.result))
+	task_states[states.SUCCESS] += batch["cached"]
+
+	archive = celery_workers.AsyncResult(batch["archive_task_id"])
+	if archive.state == states.SUCCESS:
+		state = states.SUCCESS
+	elif archive.state == states.FAILURE or task_states[states.FAILURE]:
+		state = states.FAILURE
+	elif task_states[states.PENDING] == len(batch["task_ids"]) and not batch["cached"]:
+		state = states.PENDING
+	else:
+		state = "PROCESSING"
+	return {
+		"state": state,
+		"result": {
+			"total": len(batch["task_ids"]) + batch["cached"],
+			"completed": task_states[states.SUCCESS],
+			"failed": task_states[states.FAILURE],
+			"states": dict(task_states),
+			"archive": archive.result if archive.state == states.SUCCESS else None,
+		},
+	}
+
+
 @app.get("/jobid/{task_id}")
 def check_job(task_id: str) -> str:
 	res = celery_workers.AsyncResult(task_id)
 	if res.state == states.PENDING:
-		reserved_tasks = celery_workers.control.inspect().reserved()
-		tasks = []
-		if reserved_tasks:
-			tasks_per_worker = reserved_tasks.values()
-			tasks = [item for sublist in tasks_per_worker for item in sublist]
-			found = False
-			for task in tasks:
-				if task["id"] == task_id:
-					found = True
-		result = {"jobs_in_queue": len(tasks)}
+		position, jobs_in_queue, lane = queue_index.position(task_id)
+		result = {"jobs_in_queue": jobs_in_queue, "position": position, "lane": lane}
 	elif res.state == states.FAILURE:
 		result = str(res.result)
 	else:
 		result = res.result
+		if res.state == states.SUCCESS:
+			render_cache.store(task_id, os.path.basename(result))
 	return {"state": res.state, "result": result}
 
 
+async def job_events(task_id: str, request: Request):
+	pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+	await run_in_threadpool(pubsub.subscribe, progress_channel(task_id))
+	try:
+		# the snapshot is taken after subscribing, so no transition can slip in between
+		event = await run_in_threadpool(check_job, task_id)
+		while True:
+			yield f"data: {json.dumps(event)}\n\n"
+			if event["state"] in states.READY_STATES:
+				break
+			waited = 0.0
+			event = None
+			while event is None:
+				# only reads what is already buffered on the subscription socket
+				message = pubsub.get_message()
+				if message is not None:
+					event = json.loads(message["data"])
+					if event["state"] in states.READY_STATES:
+						event = await run_in_threadpool(check_job, task_id)
+				elif waited >= PROGRESS_KEEPALIVE:
+					event = await run_in_threadpool(check_job, task_id)
+				elif await request.is_disconnected():
+					# the response does not cancel the generator, an abandoned stream would poll forever
+					return
+				else:
+					await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+					waited += PROGRESS_POLL_INTERVAL
+	finally:
+		pubsub.close()
+
+
+@app.get("/jobid/{task_id}/events")
+async def stream_job(task_id: str, request: Request):
+	return StreamingResponse(job_events(task_id, request), media_type="text/event-stream")
+
+
+@app.get("/render_cache")
+def render_cache_stats():
+	return render_cache.stats()
+
+
 @app.get("/files/{file_name}")
-async def files(file_name, background_tasks: BackgroundTasks):
-	file = UPLOAD_FOLDER / file_name
-	background_tasks.add_task(delete_tmp_file, file)
-	return FileResponse(str(file))
+async def files(file_name, request: Request):
+	# files are kept until they expire or the client acknowledges the download,
+	# so an interrupted transfer can be resumed with a Range request
+	if not await run_in_threadpool(storage.exists, file_name):
+		raise HTTPException(status_code=404, detail=f"The file {file_name} does not exist")
+	file = storage.local_path(file_name)
+	if file is None:
+		return RedirectResponse(await run_in_threadpool(storage.url, file_name))
+	return file_response(file, request.headers)
+
+
+@app.delete("/files/{file_name}")
+async def acknowledge_file(file_name):
+	await delete_tmp_file(file_name)
+	return Response(status_code=204)
 
 
 @app.post("/upload_video", response_class=PlainTextResponse)
-async def upload_video(file: UploadFile = File(...)) -> str:
-	return await save_tmp_file(file)
+async def upload_video(request: Request) -> str:
+	files = await receive_upload(request, {"file": (MAX_VIDEO_FILE_SIZE, None)}, ["file"])
+	file_key, _ = await save_tmp_file(files["file"])
+	return f"/files/{file_key}"
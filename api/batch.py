@@ -0,0 +1,98 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from shared.bvh_validation import BvhValidationError
+
+MANIFEST_NAME = "manifest.json"
+COPY_CHUNK_SIZE = 1024 * 1024
+# what zipfile raises for corrupt, truncated, encrypted or unsupported (compression) members
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError)
+
+
+class BatchError(Exception):
+	pass
+
+
+def read_manifest(archive: zipfile.ZipFile, max_items: int) -> List[Tuple[str, str, Optional[str]]]:
+	# Returns (name, bvh member, audio member) for every clip in the archive.
+	# Clips are listed in manifest.json as [{"name": ..., "bvh": ..., "audio": ...}],
+	# without a manifest every BVH file is paired with the WAV file of the same stem.
+	members = set(archive.namelist())
+	if MANIFEST_NAME in members:
+		try:
+			manifest = json.loads(archive.read(MANIFEST_NAME).decode("utf-8"))
+			items = [
+				(entry.get("name") or Path(entry["bvh"]).stem, entry["bvh"], entry.get("audio"))
+				for entry in manifest
+			]
+		except (ValueError, TypeError, KeyError, AttributeError) as e:
+			raise BatchError(f"The batch manifest could not be read ({e})")
+	else:
+		items = []
+		for member in sorted(members):
+			stem, extension = os.path.splitext(member)
+			if extension.lower() == ".bvh":
+				audio = next((m for m in [stem + ".wav", stem + ".WAV"] if m in members), None)
+				items.append((Path(stem).name, member, audio))
+
+	if not items:
+		raise BatchError("The batch archive does not contain any BVH files")
+	if len(items) > max_items:
+		raise BatchError(f"The batch contains {len(items)} clips, more than the allowed {max_items}")
+	names = [name for name, _, _ in items]
+	if len(set(names)) != len(names):
+		raise BatchError("The clip names in the batch are not unique")
+	for _, bvh, audio in items:
+		for member in [bvh, audio]:
+			if member is not None and member not in members:
+				raise BatchError(f"The file {member} is missing from the batch archive")
+	return items
+
+
+def extract_member(archive: zipfile.ZipFile, member: str, destination: Path, max_size: int, validator=None) -> Tuple[int, str]:
+	# the declared size is checked up front and the real one while copying,
+	# so a crafted archive can not inflate past the limit
+	if archive.getinfo(member).file_size > max_size:
+		raise BatchError(f"The file {member} is bigger than {max_size} bytes")
+	digest = hashlib.sha256()
+	size = 0
+	try:
+		with archive.open(member) as source, open(destination, "wb") as out:
+			while True:
+				chunk = source.read(COPY_CHUNK_SIZE)
+				if not chunk:
+					break
+				size += len(chunk)
+				if size > max_size:
+					raise BatchError(f"The file {member} is bigger than {max_size} bytes")
+				digest.update(chunk)
+				if validator is not None:
+					validator.feed(chunk)
+				out.write(chunk)
+		if validator is not None:
+			validator.finish()
+	except BvhValidationError as e:
+		destination.unlink()
+		raise BatchError(f"{member}: {e}")
+	except ARCHIVE_ERRORS as e:
+		# raised before the destination was opened for encrypted members
+		if destination.exists():
+			destination.unlink()
+		raise BatchError(f"The file {member} could not be extracted ({e})")
+	except BatchError:
+		destination.unlink()
+		raise
+	return size, digest.hexdigest()
+
@@ -0,0 +1,101 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+RENDER_ENV_KEYS = ["RENDER_RESOLUTION_X", "RENDER_RESOLUTION_Y", "RENDER_FPS", "RENDER_DURATION_FRAMES"]
+
+
+class RenderCache:
+	# Finished videos are copied (hard-linked on local storage) to an object
+	# named after their cache key, so expiring or acknowledging the served copy
+	# never touches the cached one. Redis holds the LRU order (a sorted set
+	# scored by last access time), the task id -> cache key mapping of renders in
+	# flight, and hit/miss counters.
+	def __init__(self, redis_client, storage, max_entries: int, prefix: str = "render_cache"):
+		self.redis = redis_client
+		self.storage = storage
+		self.max_entries = max_entries
+		self.prefix = prefix
+		self.lru_key = f"{prefix}:lru"
+		self.pending_prefix = f"{prefix}:pending:"
+		self.hits_key = f"{prefix}:hits"
+		self.misses_key = f"{prefix}:misses"
+
+	@property
+	def enabled(self) -> bool:
+		return self.max_entries > 0
+
+	def make_key(self, bvh_digest: str, audio_digest: Optional[str], p_rotate: str, visualization_mode: str) -> str:
+		render_env = [os.environ.get(name) for name in RENDER_ENV_KEYS]
+		fields = [bvh_digest, audio_digest, p_rotate, visualization_mode, render_env]
+		return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+	def entry_key(self, key: str) -> str:
+		return f"{self.prefix}/{key}.mp4"
+
+	def checkout(self, key: str, destination_key: str) -> bool:
+		if not self.enabled:
+			return False
+		if self.redis.zscore(self.lru_key, key) is not None:
+			try:
+				self.storage.copy(self.entry_key(key), destination_key)
+			except FileNotFoundError:
+				self.redis.zrem(self.lru_key, key)
+			else:
+				pipe = self.redis.pipeline()
+				pipe.zadd(self.lru_key, {key: time.time()})
+				pipe.incr(self.hits_key)
+				pipe.execute()
+				return True
+		self.redis.incr(self.misses_key)
+		return False
+
+	def remember(self, task_id: str, key: str, ttl: int = 24 * 60 * 60):
+		if self.enabled:
+			self.redis.set(self.pending_prefix + task_id, key, ex=ttl)
+
+	def store(self, task_id: str, video_key: str):
+		if not self.enabled:
+			return
+		pipe = self.redis.pipeline()
+		pipe.get(self.pending_prefix + task_id)
+		pipe.delete(self.pending_prefix + task_id)
+		key, _ = pipe.execute()
+		if key is None:
+			return
+		key = key.decode("utf-8")
+		try:
+			self.storage.copy(video_key, self.entry_key(key))
+		except FileNotFoundError:
+			return
+		self.redis.zadd(self.lru_key, {key: time.time()})
+		self.evict()
+
+	def evict(self):
+		overflow = self.redis.zcard(self.lru_key) - self.max_entries
+		if overflow <= 0:
+			return
+		for key, _ in self.redis.zpopmin(self.lru_key, overflow):
+			self.storage.delete(self.entry_key(key.decode("utf-8")))
+
+	def stats(self) -> dict:
+		pipe = self.redis.pipeline()
+		pipe.get(self.hits_key)
+		pipe.get(self.misses_key)
+		pipe.zcard(self.lru_key)
+		hits, misses, entries = pipe.execute()
+		return {
+			"hits": int(hits or 0),
+			"misses": int(misses or 0),
+			"entries": entries,
+			"max_entries": self.max_entries,
+		}
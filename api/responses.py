@@ -0,0 +1,102 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import mimetypes
+import os
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional, Tuple
+
+import aiofiles
+from starlette.responses import Response
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+	return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+	# returns the inclusive (start, end) byte range, None if the header should be
+	# ignored (malformed or multi-range) and raises ValueError if the range can
+	# not be satisfied
+	unit, _, spec = header.partition("=")
+	first, separator, last = spec.strip().partition("-")
+	if unit.strip().lower() != "bytes" or not separator or "," in spec:
+		return None
+	if not (first.isdigit() or first == "") or not (last.isdigit() or last == "") or first == last == "":
+		return None
+	if first == "":
+		if int(last) == 0:
+			raise ValueError
+		return max(size - int(last), 0), size - 1
+	start = int(first)
+	end = int(last) if last else size - 1
+	if last and end < start:
+		return None
+	if start >= size:
+		raise ValueError
+	return start, min(end, size - 1)
+
+
+class RangedFileResponse(Response):
+	# Serves a byte range of a file. Servers that implement the ASGI zero-copy
+	# send extension get the file descriptor and hand it to sendfile(2); others
+	# receive it in chunks read off the event loop.
+	chunk_size = 256 * 1024
+
+	def __init__(self, path: Path, stat_result: os.stat_result, byte_range: Optional[Tuple[int, int]]):
+		size = stat_result.st_size
+		self.path = path
+		self.start, self.end = byte_range if byte_range is not None else (0, size - 1)
+		media_type = mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+		headers = {
+			"accept-ranges": "bytes",
+			"etag": make_etag(stat_result),
+			"last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+			"content-length": str(self.end - self.start + 1),
+		}
+		if byte_range is not None:
+			headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+		super().__init__(status_code=206 if byte_range is not None else 200, headers=headers, media_type=media_type)
+
+	async def __call__(self, scope, receive, send):
+		await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+		count = self.end - self.start + 1
+		if scope["method"] == "HEAD" or count <= 0:
+			await send({"type": "http.response.body", "body": b""})
+		elif "http.response.zerocopysend" in scope.get("extensions", {}):
+			with open(self.path, "rb") as file:
+				await send({"type": "http.response.zerocopysend", "file": file, "offset": self.start, "count": count})
+		else:
+			async with aiofiles.open(self.path, "rb") as file:
+				await file.seek(self.start)
+				while count > 0:
+					chunk = await file.read(min(self.chunk_size, count))
+					if not chunk:
+						break
+					count -= len(chunk)
+					await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+				if count > 0:
+					await send({"type": "http.response.body", "body": b""})
+
+
+def file_response(path: Path, request_headers) -> Response:
+	stat_result = path.stat()
+	etag = make_etag(stat_result)
+	if_none_match = request_headers.get("if-none-match")
+	if if_none_match is not None and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+		return Response(status_code=304, headers={"etag": etag, "accept-ranges": "bytes"})
+
+	byte_range = None
+	range_header = request_headers.get("range")
+	if_range = request_headers.get("if-range")
+	if range_header is not None and (if_range is None or if_range.strip() == etag):
+		try:
+			byte_range = parse_range(range_header, stat_result.st_size)
+		except ValueError:
+			return Response(status_code=416, headers={"content-range": f"bytes */{stat_result.st_size}", "etag": etag})
+	return RangedFileResponse(path, stat_result, byte_range)
@@ -0,0 +1,144 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+import multipart
+from multipart.multipart import parse_options_header
+
+from shared.bvh_validation import BvhValidationError, BvhValidator
+
+
+class UploadError(Exception):
+	def __init__(self, status_code: int, detail: str):
+		super().__init__(detail)
+		self.status_code = status_code
+
+
+class StagedUpload:
+	# One file field written to the staging folder as its bytes arrive, hashed,
+	# size checked and optionally validated on the way.
+	def __init__(self, folder: Path, filename: str, max_size: int, validator: Optional[BvhValidator] = None):
+		_, extension = os.path.splitext(filename)
+		self.filename = filename
+		self.path = folder / f"{uuid4()}{extension}"
+		self.max_size = max_size
+		self.validator = validator
+		self.digest = hashlib.sha256()
+		self.size = 0
+		self.file = open(self.path, "wb")
+
+	def write(self, data: bytes):
+		self.size += len(data)
+		if self.size > self.max_size:
+			raise UploadError(413, f"The supplied file ({self.filename}) is bigger than {self.max_size} bytes")
+		self.digest.update(data)
+		if self.validator is not None:
+			try:
+				self.validator.feed(data)
+			except BvhValidationError as e:
+				raise UploadError(400, str(e))
+		self.file.write(data)
+
+	def finish(self):
+		self.file.close()
+		if self.validator is not None:
+			try:
+				self.validator.finish()
+			except BvhValidationError as e:
+				raise UploadError(400, str(e))
+
+	def discard(self):
+		self.file.close()
+		if self.path.exists():
+			self.path.unlink()
+
+
+class MultipartUpload:
+	# Parses a multipart/form-data body chunk by chunk as it is received, instead
+	# of letting the framework spool the whole body first, so a file over its
+	# limit or a malformed BVH is rejected after the bytes that show it. fields
+	# maps the accepted file fields to their (max size, validator); other fields
+	# are skipped.
+	def __init__(self, content_type: str, folder: Path, fields: Dict[str, Tuple[int, Optional[BvhValidator]]]):
+		_, params = parse_options_header(content_type)
+		boundary = params.get(b"boundary")
+		if not boundary:
+			raise UploadError(400, "The request is not a multipart/form-data upload")
+		self.folder = folder
+		self.fields = fields
+		self.files: Dict[str, StagedUpload] = {}
+		self.current: Optional[StagedUpload] = None
+		self.headers: Dict[bytes, bytes] = {}
+		self.header_field = b""
+		self.header_value = b""
+		self.complete = False
+		self.parser = multipart.MultipartParser(boundary, {
+			"on_part_begin": self.on_part_begin,
+			"on_header_field": self.on_header_field,
+			"on_header_value": self.on_header_value,
+			"on_header_end": self.on_header_end,
+			"on_headers_finished": self.on_headers_finished,
+			"on_part_data": self.on_part_data,
+			"on_part_end": self.on_part_end,
+			"on_end": self.on_end,
+		})
+
+	def on_part_begin(self):
+		self.current = None
+		self.headers = {}
+
+	def on_header_field(self, data: bytes, start: int, end: int):
+		self.header_field += data[start:end]
+
+	def on_header_value(self, data: bytes, start: int, end: int):
+		self.header_value += data[start:end]
+
+	def on_header_end(self):
+		self.headers[self.header_field.lower()] = self.header_value
+		self.header_field = b""
+		self.header_value = b""
+
+	def on_headers_finished(self):
+		_, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+		name = options.get(b"name", b"").decode("utf-8", "replace")
+		if name not in self.fields or b"filename" not in options:
+			return
+		if name in self.files:
+			raise UploadError(400, f"The field {name} was supplied more than once")
+		max_size, validator = self.fields[name]
+		self.current = StagedUpload(self.folder, options[b"filename"].decode("utf-8", "replace"), max_size, validator)
+		self.files[name] = self.current
+
+	def on_part_data(self, data: bytes, start: int, end: int):
+		if self.current is not None:
+			self.current.write(data[start:end])
+
+	def on_part_end(self):
+		if self.current is not None:
+			self.current.finish()
+			self.current = None
+
+	def on_end(self):
+		self.complete = True
+
+	def write(self, chunk: bytes):
+		self.parser.write(chunk)
+
+	def finish(self) -> Dict[str, StagedUpload]:
+		self.parser.finalize()
+		if not self.complete:
+			raise UploadError(400, "The multipart body ended before its closing boundary")
+		return self.files
+
+	def discard(self):
+		for staged in self.files.values():
+			staged.discard()
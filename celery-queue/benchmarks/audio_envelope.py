@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import wave
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "scripts"))
+import edit_audio
+import wav_file
+
+# Compares the speech bubble envelope of blender_render_2023.py computed with
+# get_volume_strided (a seek and a one frame read per 1 ms sample) and with
+# get_volume_envelope (one read of the file, one gather for all frames) or
+# volume_envelope on a memory-mapped WavFile, and checks that all return the
+# same values. The same is done for the bubble
+# scale computed from the envelope with the list comprehensions and
+# smooth_kernel, and with speech_envelope. A WAV file can be given, otherwise
+# a synthetic speech-like one (noise bursts and pauses) is written.
+#
+# python benchmarks/audio_envelope.py [-i speech.wav] [-s 180]
+
+def write_synthetic_wav(path, seconds, rate, channels, seed=0):
+    rng = np.random.default_rng(seed)
+    nframes = int(seconds * rate)
+    samples = rng.normal(0, 6000, (nframes, channels))
+    # about half a second of talking, then a pause of up to a second
+    talking = (np.arange(nframes) // (rate // 2)) % 3 != 2
+    samples[~talking] *= 0.01
+    samples = np.clip(samples, -32768, 32767).astype(np.int16)
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(channels)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(samples.tobytes())
+
+def list_speech_envelope(volumes):
+    # the steps blender_render_2023.py used to take
+    volumes = [abs(x) / 32768 for x in volumes]
+    volumes = [x / max(volumes) for x in volumes]
+    volumes = [0 if x < 0.2 else 1 for x in volumes]
+    volumes = edit_audio.smooth_kernel(volumes, 10)
+    return [max(0.0075, x * 0.05) for x in volumes]
+
+def timed(function, *args):
+    start = time.perf_counter()
+    return function(*args), time.perf_counter() - start
+
+def measure(envelope, path, fps):
+    with wave.open(path, 'rb') as audio:
+        start = time.perf_counter()
+        volumes = envelope(audio, 1 / fps, -1, -1)
+        return volumes, time.perf_counter() - start
+
+def measure_mapped(path, fps):
+    start = time.perf_counter()
+    audio = wav_file.WavFile(path)
+    volumes = edit_audio.volume_envelope(audio.int16(0), audio.rate, 1 / fps, -1, -1)
+    return volumes, time.perf_counter() - start
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the speech bubble envelope.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', '--input', help='A 16 bit WAV file, a synthetic one is written if not given.')
+    parser.add_argument('-s', '--seconds', type=float, default=180, help='Length of the synthetic file.')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='Sample rate of the synthetic file.')
+    parser.add_argument('-c', '--channels', type=int, default=1, help='Channels of the synthetic file.')
+    parser.add_argument('--fps', type=int, default=30)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.input
+        if path is None:
+            path = os.path.join(tmp_dir, 'speech.wav')
+            write_synthetic_wav(path, args.seconds, args.rate, args.channels)
+        strided, strided_seconds = measure(edit_audio.get_volume_strided, path, args.fps)
+        envelope, envelope_seconds = measure(edit_audio.get_volume_envelope, path, args.fps)
+        mapped, mapped_seconds = measure_mapped(path, args.fps)
+    for name, volumes in [('get_volume_envelope', envelope), ('volume_envelope', mapped)]:
+        if len(strided) != len(volumes) or any(a != b for a, b in zip(strided, volumes)):
+            raise RuntimeError(f'{name} differs from get_volume_strided')
+    list_scale, list_seconds = timed(list_speech_envelope, strided)
+    scale, scale_seconds = timed(edit_audio.speech_envelope, envelope)
+    if len(list_scale) != len(scale) or any(a != b for a, b in zip(list_scale, scale)):
+        raise RuntimeError('speech_envelope differs from the list comprehensions')
+    print(f'{len(envelope)} frames at {args.fps} fps, identical envelopes and bubble scales')
+    print(f"{'function':<22}{'seconds':>10}")
+    print(f"{'get_volume_strided':<22}{strided_seconds:>10.3f}")
+    print(f"{'get_volume_envelope':<22}{envelope_seconds:>10.3f}")
+    print(f"{'volume_envelope (mmap)':<22}{mapped_seconds:>10.3f}")
+    print(f"{'list comprehensions':<22}{list_seconds:>10.3f}")
+    print(f"{'speech_envelope':<22}{scale_seconds:>10.5f}")
+
+if __name__ == '__main__':
+    main()
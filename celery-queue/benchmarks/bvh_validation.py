@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from bvh import Bvh
+from shared.bvh_validation import BvhValidator
+
+# Compares the worker's BVH re-check, the streaming BvhValidator, with the
+# implementation it replaced, which decoded the whole file, built a bvh.Bvh
+# from it and split the text again to count the motion rows. Both get the
+# same file, a synthetic one of the given length (the GENEA skeleton has 171
+# channels) unless a BVH file is given. Time is the best of the repeats, memory
+# is the peak Python allocation of one run.
+#
+# python benchmarks/bvh_validation.py [-i motion.bvh] [-n 18000]
+
+CHUNK_SIZE = 1024 * 1024
+
+def legacy_validate(bvh_bytes, max_number_frames, fps):
+    frame_time = 1.0 / fps
+    frame_epsilon = 0.00001
+    file_content = bvh_bytes.decode("utf-8")
+    mocap = Bvh(file_content)
+    counter = None
+    for line in file_content.split("\n"):
+        if counter is not None and line.strip():
+            counter += 1
+        if line.strip() == "MOTION":
+            counter = -2
+    if mocap.nframes != counter:
+        raise ValueError(f"The number of rows with motion data ({counter}) does not match the Frames field ({mocap.nframes})")
+    if max_number_frames != -1 and mocap.nframes > max_number_frames:
+        raise ValueError(f"The supplied number of frames ({mocap.nframes}) is bigger than {max_number_frames}")
+    if mocap.frame_time < frame_time - frame_epsilon or mocap.frame_time > frame_time + frame_epsilon:
+        raise ValueError(f"The supplied frame time ({mocap.frame_time}) differs from the required {frame_time} (+/- {frame_epsilon})")
+    return mocap.nframes
+
+def streaming_validate(path, max_number_frames, fps):
+    validator = BvhValidator(max_number_frames, fps)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            validator.feed(chunk)
+    return validator.finish()
+
+def legacy_from_file(path, max_number_frames, fps):
+    # the worker read the whole upload before validating it
+    with open(path, "rb") as f:
+        return legacy_validate(f.read(), max_number_frames, fps)
+
+def write_synthetic_bvh(path, nframes, joints, fps):
+    with open(path, "w") as f:
+        f.write("HIERARCHY\nROOT Hips\n{\n\tOFFSET 0 0 0\n\tCHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation\n")
+        for joint in range(joints - 1):
+            f.write(f"\tJOINT Joint{joint}\n\t{{\n\t\tOFFSET 0 1 0\n\t\tCHANNELS 3 Zrotation Xrotation Yrotation\n")
+            f.write("\t\tEnd Site\n\t\t{\n\t\t\tOFFSET 0 1 0\n\t\t}\n\t}\n")
+        f.write("}\n")
+        f.write(f"MOTION\nFrames: {nframes}\nFrame Time: {1.0 / fps:.6f}\n")
+        row = " ".join(f"{(i % 360) - 180 + 0.123456:.6f}" for i in range(6 + 3 * (joints - 1)))
+        for _ in range(nframes):
+            f.write(row + "\n")
+
+def measure(validate, path, max_number_frames, fps, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        nframes = validate(path, max_number_frames, fps)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    tracemalloc.start()
+    validate(path, max_number_frames, fps)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return nframes, best, peak
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the worker's BVH validation.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', '--input', help='A BVH file to validate, a synthetic one is written if not given.')
+    parser.add_argument('-n', '--frames', type=int, default=18000, help='Frames of the synthetic file.')
+    parser.add_argument('-j', '--joints', type=int, default=56, help='Joints of the synthetic file.')
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('-r', '--repeats', type=int, default=3)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    path = args.input
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), f'synthetic_{args.frames}.bvh')
+        write_synthetic_bvh(path, args.frames, args.joints, args.fps)
+    try:
+        print(f'{path}: {os.path.getsize(path) / 1024 / 1024:.1f} MiB')
+        print(f"{'validator':<12}{'frames':>8}{'seconds':>10}{'peak (MiB)':>12}")
+        for name, validate in [('bvh.Bvh', legacy_from_file), ('streaming', streaming_validate)]:
+            nframes, seconds, peak = measure(validate, path, -1, args.fps, args.repeats)
+            print(f'{name:<12}{nframes:>8}{seconds:>10.3f}{peak / 1024 / 1024:>12.1f}')
+    finally:
+        if args.input is None:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
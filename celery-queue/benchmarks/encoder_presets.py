@@ -0,0 +1,67 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "scripts"))
+import encoder
+
+# Compares the x264 presets of the piped encoder (--encoder pipe of the render
+# script) on the same BMP frames Blender would write. The frames are cut from a
+# rendered video, or generated with ffmpeg's testsrc2 if no video is given, at
+# the server resolution (1024x768, 30 fps) unless told otherwise.
+#
+# python benchmarks/encoder_presets.py [-i rendered.mp4] [-p superfast veryfast medium]
+
+def extract_frames(frame_dir, video, res_x, res_y, fps, frames, ffmpeg):
+    source = ['-i', video] if video else ['-f', 'lavfi', '-i', f'testsrc2=size={res_x}x{res_y}:rate={fps}']
+    subprocess.run(
+        [ffmpeg, '-y', '-loglevel', 'error'] + source + ['-vf', f'scale={res_x}:{res_y}', '-frames:v', str(frames), '-c:v', 'bmp', os.path.join(frame_dir, 'frame_%04d.bmp')],
+        check=True,
+    )
+    return sorted(glob.glob(os.path.join(frame_dir, 'frame_*.bmp')))
+
+def encode(frame_files, output_file, fps, preset, crf, threads, pix_fmt, ffmpeg):
+    command = encoder.encoder_command(output_file, fps, preset, crf, threads, pix_fmt, ffmpeg=ffmpeg)
+    start = time.time()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    for frame_file in frame_files:
+        with open(frame_file, 'rb') as frame:
+            shutil.copyfileobj(frame, process.stdin)
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f'ffmpeg failed for preset {preset}')
+    return time.time() - start
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the presets of the piped encoder.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', '--input', help='A rendered video to take the frames from, testsrc2 is used if not given.')
+    parser.add_argument('-p', '--presets', nargs='+', default=['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium'])
+    parser.add_argument('-n', '--frames', type=int, default=300)
+    parser.add_argument('-rx', '--res_x', type=int, default=1024)
+    parser.add_argument('-ry', '--res_y', type=int, default=768)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--crf', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--pix_fmt', default='yuv420p')
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        frame_files = extract_frames(tmp_dir, args.input, args.res_x, args.res_y, args.fps, args.frames, args.ffmpeg)
+        print(f'{len(frame_files)} frames at {args.res_x}x{args.res_y}, crf {args.crf}, {args.pix_fmt}')
+        print(f"{'preset':<12}{'seconds':>10}{'fps':>10}{'size (KiB)':>12}")
+        for preset in args.presets:
+            output_file = os.path.join(tmp_dir, f'{preset}.mp4')
+            seconds = encode(frame_files, output_file, args.fps, preset, args.crf, args.threads, args.pix_fmt, args.ffmpeg)
+            size = os.path.getsize(output_file) / 1024
+            print(f'{preset:<12}{seconds:>10.2f}{len(frame_files) / seconds:>10.1f}{size:>12.0f}')
+
+if __name__ == '__main__':
+    main()
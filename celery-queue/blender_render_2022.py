@@ -8,6 +8,16 @@ import time
 import argparse
 import tempfile
 from pathlib import Path
+import importlib
+
+if bpy.ops.text.run_script.poll():
+    script_dir = Path(bpy.context.space_data.text.filepath).parents[0]
+else:
+    script_dir = Path(os.path.realpath(__file__)).parents[0]
+sys.path.append(os.path.join(script_dir, "scripts"))
+
+import frame_pipe
+importlib.reload(frame_pipe)
 
 # cleans up the scene and memory
 def clear_scene():
@@ -161,7 +171,7 @@ def load_audio(filepath):
         frame_start=0
     )
     
-def render_video(output_dir, picture, video, bvh_fname, render_frame_start, render_frame_length, res_x, res_y):
+def render_video(output_dir, picture, video, bvh_fname, render_frame_start, render_frame_length, res_x, res_y, encoder=None):
     bpy.context.scene.render.engine = 'BLENDER_WORKBENCH'
     bpy.context.scene.display.shading.light = 'MATCAP'
     bpy.context.scene.display.render_aa = 'FXAA'
@@ -178,7 +188,14 @@ def render_video(output_dir, picture, video, bvh_fname, render_frame_start, rend
         bpy.context.scene.render.filepath=os.path.join(output_dir, '{}.png'.format(bvh_fname))
         bpy.ops.render.render(write_still=True)
         
-    if video:
+    if video and encoder is not None:
+        # frames are piped to an external ffmpeg, named like Blender names its own videos
+        print(f"total_frames {render_frame_length}", flush=True)
+        scene = bpy.context.scene
+        output_file = os.path.join(output_dir, '{}_{:04d}-{:04d}.mp4'.format(bvh_fname, scene.frame_start, scene.frame_end))
+        with frame_pipe.FramePipe(scene, output_file, **encoder):
+            bpy.ops.render.render(animation=True)
+    elif video:
         print(f"total_frames {render_frame_length}", flush=True)
         bpy.context.scene.render.image_settings.file_format='FFMPEG'
         bpy.context.scene.render.ffmpeg.format='MPEG4'
@@ -203,6 +220,11 @@ def parse_args():
     parser.add_argument('-m', "--visualization_mode", help='The visualization mode to use for rendering.',type=str, choices=['full_body', 'upper_body'], default='full_body')
     parser.add_argument('-rx', '--res_x', help='The horizontal resolution for the rendered videos.', type=int, default=1024)
     parser.add_argument('-ry', '--res_y', help='The vertical resolution for the rendered videos.', type=int, default=768)  
+    parser.add_argument('-e', '--encoder', help='Encode the video with Blender, or pipe the frames to a separate ffmpeg process.', choices=['blender', 'pipe'], default='blender')
+    parser.add_argument('--encoder_preset', help='x264 preset of the piped encoder.', type=str, default='superfast')
+    parser.add_argument('--encoder_crf', help='Constant rate factor of the piped encoder.', type=int, default=20)
+    parser.add_argument('--encoder_threads', help='Threads of the piped encoder, 0 lets ffmpeg decide.', type=int, default=0)
+    parser.add_argument('--encoder_pix_fmt', help='Pixel format of the piped encoder output.', type=str, default='yuv420p')
     argv = sys.argv
     argv = argv[argv.index("--") + 1 :]
     return vars(parser.parse_args(args=argv))
@@ -229,6 +251,7 @@ def main():
         ARG_RESOLUTION_X = 1024
         ARG_RESOLUTION_Y = 768
         ARG_MODE = 'full_body'
+        ARG_ENCODER = None
         ARG_OUTPUT_DIR = ARG_BVH_PATHNAME.parents[0]
     else:
         print('[INFO] Script is running from command line.')
@@ -245,6 +268,17 @@ def main():
         ARG_RESOLUTION_X = args['res_x']
         ARG_RESOLUTION_Y = args['res_y']
         ARG_MODE = args['visualization_mode']
+        ARG_ENCODER = None
+        if args['encoder'] == 'pipe':
+            ARG_ENCODER = {
+                'preset': args['encoder_preset'],
+                'crf': args['encoder_crf'],
+                'threads': args['encoder_threads'],
+                'pix_fmt': args['encoder_pix_fmt'],
+            }
+            if ARG_AUDIO_FILE_NAME:
+                # muxed by the encoder, the sequencer audio is not written with piped frames
+                ARG_ENCODER['audio_file'] = str(ARG_AUDIO_FILE_NAME)
         ARG_OUTPUT_DIR = args['output_dir'].resolve() if args['output_dir'] else ARG_BVH_PATHNAME.parents[0]
         
         
@@ -276,7 +310,7 @@ def main():
         os.mkdir(str(ARG_OUTPUT_DIR))
         
     total_frames = bpy.data.objects[BVH_NAME].animation_data.action.frame_range.y
-    render_video(str(ARG_OUTPUT_DIR), ARG_IMAGE, ARG_VIDEO, BVH_NAME, ARG_START_FRAME, min(ARG_DURATION_IN_FRAMES, total_frames), ARG_RESOLUTION_X, ARG_RESOLUTION_Y)
+    render_video(str(ARG_OUTPUT_DIR), ARG_IMAGE, ARG_VIDEO, BVH_NAME, ARG_START_FRAME, min(ARG_DURATION_IN_FRAMES, total_frames), ARG_RESOLUTION_X, ARG_RESOLUTION_Y, ARG_ENCODER)
 
     end = time.time()
     all_time = end - start
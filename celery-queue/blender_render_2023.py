@@ -8,7 +8,6 @@ import time
 import argparse
 import tempfile
 from pathlib import Path as myPath
-import wave
 import numpy as np
 import importlib
 
@@ -30,6 +29,20 @@ import edit_character
 importlib.reload(edit_character)
 import edit_audio
 importlib.reload(edit_audio)
+import envelope_cache
+importlib.reload(envelope_cache)
+import bake_animation
+importlib.reload(bake_animation)
+import scene_template
+importlib.reload(scene_template)
+import create_compositor
+importlib.reload(create_compositor)
+import compose_video
+importlib.reload(compose_video)
+
+VIEWS = ['main-agent', 'interloctr', 'dyadic', 'composite']
+# the camera passes of render_video, in the order they are rendered
+VIEW_PASSES = ['main-agent', 'interloctr', 'dyadic']
 
 # cleans up the scene and memory
 def clear_scene():
@@ -57,7 +70,22 @@ def clear_scene():
 def create_sequencer():
     bpy.context.scene.sequence_editor_create()
     
-def render_video(output_dir, picture, video, filename_token, actor1, actor2, render_frame_start, render_frame_length, res_x, res_y):
+def parse_views(views):
+    views = [view.strip() for view in views.split(',') if view.strip()]
+    for view in views:
+        if view not in VIEWS:
+            raise argparse.ArgumentTypeError('Unknown view "{}", choose from {}.'.format(view, ', '.join(VIEWS)))
+    if not views:
+        raise argparse.ArgumentTypeError('At least one view is needed.')
+    return views
+
+def render_passes(views, single_pass):
+    # the sequencer composite is made from all three camera passes, the single pass layout renders them itself
+    if 'composite' in views and not single_pass:
+        return VIEW_PASSES
+    return [view for view in VIEW_PASSES if view in views]
+
+def render_video(output_dir, picture, video, filename_token, actor1, actor2, render_frame_start, render_frame_length, res_x, res_y, passes=VIEW_PASSES):
     bpy.context.scene.render.engine = 'BLENDER_WORKBENCH'
     bpy.context.scene.display.shading.light = 'MATCAP'
     bpy.context.scene.display.render_aa = 'FXAA'
@@ -100,29 +128,41 @@ def render_video(output_dir, picture, video, filename_token, actor1, actor2, ren
         bpy.context.scene.render.ffmpeg.constant_rate_factor='HIGH'
         bpy.context.scene.render.ffmpeg.audio_codec='MP3'
         bpy.context.scene.render.ffmpeg.gopsize = 30
-        create_camera.get_camera(actor1 + '_cam')
-        bpy.data.objects[actor1].children[1].hide_render = False
-        bpy.data.objects[actor2].children[1].hide_render = True
-        bpy.context.scene.render.filepath = main_filepath
-        bpy.ops.render.render(animation=True, write_still=True)
-        create_camera.get_camera(actor2 + '_cam')
-        bpy.data.objects[actor1].children[1].hide_render = True
-        bpy.data.objects[actor2].children[1].hide_render = False
-        bpy.context.scene.render.filepath = intr_filepath
-        bpy.ops.render.render(animation=True, write_still=True)
-        create_camera.get_camera('Main_cam')
-        bpy.data.objects[actor1].children[1].hide_render = False
-        bpy.data.objects[actor2].children[1].hide_render = False
-        bpy.context.scene.render.filepath = dyad_filepath
-        bpy.ops.render.render(animation=True, write_still=True)
+        if 'main-agent' in passes:
+            create_camera.get_camera(actor1 + '_cam')
+            bpy.data.objects[actor1].children[1].hide_render = False
+            bpy.data.objects[actor2].children[1].hide_render = True
+            bpy.context.scene.render.filepath = main_filepath
+            bpy.ops.render.render(animation=True, write_still=True)
+        if 'interloctr' in passes:
+            create_camera.get_camera(actor2 + '_cam')
+            bpy.data.objects[actor1].children[1].hide_render = True
+            bpy.data.objects[actor2].children[1].hide_render = False
+            bpy.context.scene.render.filepath = intr_filepath
+            bpy.ops.render.render(animation=True, write_still=True)
+        if 'dyadic' in passes:
+            create_camera.get_camera('Main_cam')
+            bpy.data.objects[actor1].children[1].hide_render = False
+            bpy.data.objects[actor2].children[1].hide_render = False
+            bpy.context.scene.render.filepath = dyad_filepath
+            bpy.ops.render.render(animation=True, write_still=True)
     return dyad_filepath, main_filepath, intr_filepath
 
+def load_speech_envelope(audio_file, framerate, cache):
+    # the cached envelope, else the audio is analysed
+    audio_file = os.path.abspath(str(audio_file))
+    if cache is not None:
+        return np.load(str(cache.get(audio_file, framerate)))
+    return envelope_cache.compute_envelope(audio_file, framerate)
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Some description.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('-imb', '--input_main_bvh', help='Input filename of the main agent BVH motion file.', type=myPath, required=True)
     parser.add_argument('-iib', '--input_intr_bvh', help='Input filename of the interlocutor BVH motion file', type=myPath, required=True)
     parser.add_argument('-imw', '--input_main_wav', help='Input filename of the main agent WAV audio file.', type=myPath)
     parser.add_argument('-iiw', '--input_intr_wav', help='Input filename of the interlocutor WAV audio file.', type=myPath)
+    parser.add_argument('-ec', '--envelope_cache', help='Directory of the speech bubble envelope cache. The envelopes of both speakers are read from there, or analysed and stored there on the first render of an audio file.', type=myPath)
+    parser.add_argument('--envelope_cache_max_bytes', help='Size bound of the envelope cache, the least recently used envelopes are removed beyond it.', type=int, default=64 * 1024 * 1024)
     parser.add_argument('-o', '--output_dir', help='Output directory where the rendered video files will be saved to. Will use "<script directory/output/" if not specified.', type=myPath)
     parser.add_argument('-n', '--output_name', help='The name to use when outputting intermediate and final files. No periods \".\" or slashes \"/\" / \"\\\" allowed.', type=str, required=True)
     parser.add_argument('-s', '--start', help='Which frame to start rendering from.', type=int, default=0)
@@ -134,6 +174,10 @@ def parse_args():
     parser.add_argument('-rx', '--res_x', help='The horizontal resolution for the rendered videos.', type=int, default=1280)
     parser.add_argument('-ry', '--res_y', help='The vertical resolution for the rendered videos.', type=int, default=720)
     parser.add_argument('-sb', '--speechbubble', action='store_true', help='Visualize speaker bubble.')
+    parser.add_argument('-vw', '--views', help='Comma separated list of the videos to output: {}. The composite needs all three camera views, unless --single_pass is used.'.format(', '.join(VIEWS)), type=parse_views, default=','.join(VIEWS))
+    parser.add_argument('-sp', '--single_pass', action='store_true', help='Render the composite with the compositor, in the same animation pass as all its camera views.')
+    parser.add_argument('-fc', '--ffmpeg_composite', action='store_true', help='Composite the rendered views with one ffmpeg filter graph (audio included) instead of rendering them again through the sequencer.')
+    parser.add_argument('-t', '--template_dir', help='Directory of the prebaked scene template. The template is built there on the first run, and rebuilt whenever the model or the scripts change.', type=myPath)
     argv = sys.argv
     argv = argv[argv.index("--") + 1 :]
     return vars(parser.parse_args(args=argv))
@@ -154,6 +198,8 @@ def main():
         ARG_INTR_BVH_FILE = SCRIPT_DIR / 'test/' / 'val_2023_v0_000_interloctr.bvh'
         ARG_MAIN_AUDIO_FILE = SCRIPT_DIR / 'test/' / 'val_2023_v0_000_main-agent.wav' # set to None for no audio
         ARG_INTR_AUDIO_FILE = SCRIPT_DIR / 'test/' / 'val_2023_v0_000_interloctr.wav' # set to None for no audio
+        ARG_ENVELOPE_CACHE_DIR = None
+        ARG_ENVELOPE_CACHE_MAX_BYTES = 0
         ARG_IMAGE = False
         ARG_VIDEO = True
         ARG_START_FRAME = 0
@@ -163,6 +209,10 @@ def main():
         ARG_RESOLUTION_Y = 720
         ARG_MODE = 'full_body'
         ARG_BUBBLE = False
+        ARG_TEMPLATE_DIR = None
+        ARG_VIEWS = VIEWS
+        ARG_SINGLE_PASS = False
+        ARG_FFMPEG_COMPOSITE = False
         # might need to adjust output directory
         ARG_OUTPUT_DIR = SCRIPT_DIR / 'output/'
         ARG_OUTPUT_NAME = "blender_output"
@@ -176,6 +226,8 @@ def main():
         ARG_INTR_BVH_FILE = args['input_intr_bvh']
         ARG_MAIN_AUDIO_FILE = args['input_main_wav'].resolve() if args['input_main_wav'] else None
         ARG_INTR_AUDIO_FILE = args['input_intr_wav'].resolve() if args['input_intr_wav'] else None
+        ARG_ENVELOPE_CACHE_DIR = args['envelope_cache'].resolve() if args['envelope_cache'] else None
+        ARG_ENVELOPE_CACHE_MAX_BYTES = args['envelope_cache_max_bytes']
         ARG_IMAGE = args['png']
         ARG_VIDEO = args['video'] # set to 'False' to get a quick image preview
         ARG_START_FRAME = args['start']
@@ -185,6 +237,10 @@ def main():
         ARG_RESOLUTION_Y = args['res_y']
         ARG_MODE = args['visualization_mode']
         ARG_BUBBLE = args['speechbubble']
+        ARG_TEMPLATE_DIR = args['template_dir'].resolve() if args['template_dir'] else None
+        ARG_VIEWS = args['views']
+        ARG_SINGLE_PASS = args['single_pass']
+        ARG_FFMPEG_COMPOSITE = args['ffmpeg_composite']
         # might need to adjust output directory
         ARG_OUTPUT_DIR = args['output_dir'].resolve() if args['output_dir'] else SCRIPT_DIR / 'output/'
         ARG_OUTPUT_NAME = args['output_name']
@@ -204,21 +260,36 @@ def main():
     AUDIO1_NAME = os.path.basename(ARG_MAIN_AUDIO_FILE)
     AUDIO2_NAME = os.path.basename(ARG_INTR_AUDIO_FILE)
 
+    # 05/04/2023 fix main camera orientation, fix character rotation and personal cameras
+    if ARG_MODE == "full_body":     CAM_POS = [3.25, 0, 1.8]
+    elif ARG_MODE == "upper_body":  CAM_POS = [0, -2.45, 1.3]
+    MAIN_CAM_ROT = [math.radians(80), 0, math.radians(90)]
+
     start = time.time()
     
-    clear_scene()
-    
     OBJ1_friendly_name = 'OBJ1'
-    load_data.load_fbx(FBX_MODEL, OBJ1_friendly_name)
-    create_material.add_materials(SCRIPT_DIR, OBJ1_friendly_name)
-    load_data.load_bvh(str(ARG_MAIN_BVH_FILE))
-    edit_character.constraintBoneTargets(armature = OBJ1_friendly_name, rig = MAIN_BVH_NAME, mode = ARG_MODE)
-    
     OBJ2_friendly_name = 'OBJ2'
-    load_data.load_fbx(FBX_MODEL, OBJ2_friendly_name)
-    create_material.add_materials(SCRIPT_DIR, OBJ2_friendly_name)
-    load_data.load_bvh(str(ARG_INTR_BVH_FILE))
-    edit_character.constraintBoneTargets(armature = OBJ2_friendly_name, rig = INTR_BVH_NAME, mode = ARG_MODE)
+    if ARG_TEMPLATE_DIR:
+        # the characters, cameras, floor and sky come from the template, only the motion is loaded
+        template_found = scene_template.open_template(ARG_TEMPLATE_DIR, SCRIPT_DIR, MAIN_CAM_ROT, clear_scene)
+        print("scene_template", "opened" if template_found else "built", flush=True)
+        load_data.load_bvh(str(ARG_MAIN_BVH_FILE))
+        edit_character.constraintBoneTargets(armature = OBJ1_friendly_name, rig = MAIN_BVH_NAME, mode = ARG_MODE)
+        load_data.load_bvh(str(ARG_INTR_BVH_FILE))
+        edit_character.constraintBoneTargets(armature = OBJ2_friendly_name, rig = INTR_BVH_NAME, mode = ARG_MODE)
+    else:
+        clear_scene()
+        
+        load_data.load_fbx(FBX_MODEL, OBJ1_friendly_name)
+        create_material.add_materials(SCRIPT_DIR, OBJ1_friendly_name)
+        load_data.load_bvh(str(ARG_MAIN_BVH_FILE))
+        edit_character.constraintBoneTargets(armature = OBJ1_friendly_name, rig = MAIN_BVH_NAME, mode = ARG_MODE)
+        
+        load_data.load_fbx(FBX_MODEL, OBJ2_friendly_name)
+        create_material.add_materials(SCRIPT_DIR, OBJ2_friendly_name)
+        load_data.load_bvh(str(ARG_INTR_BVH_FILE))
+        edit_character.constraintBoneTargets(armature = OBJ2_friendly_name, rig = INTR_BVH_NAME, mode = ARG_MODE)
+    print("scene_setup_time", round(time.time() - start, 3), flush=True)
     
     edit_character.setup_characters(MAIN_BVH_NAME, INTR_BVH_NAME)
     
@@ -249,125 +320,125 @@ def main():
         os.mkdir(str(output_dir))
     
     framerate = bpy.context.scene.render.fps
-    audio_proc1 = wave.open(os.path.abspath(ARG_MAIN_AUDIO_FILE), 'rb')
-    audio_samples1 = edit_audio.get_volume_strided(audio_proc1, 1 / framerate, -1, -1)
-    audio_samples1 = [abs(x) / 32768 for x in audio_samples1] # normalize scale between 0 and 1
-    audio_samples1 = [x / max(audio_samples1) for x in audio_samples1] # normalize data between 0 and 1
-    audio_samples1 = [0 if x < 0.2 else 1 for x in audio_samples1]
-    audio_samples1 = edit_audio.smooth_kernel(audio_samples1, 10)
-    audio_samples1 = [max(0.0075, x * 0.05) for x in audio_samples1] # scale down and clamp to min
-    
-    audio_proc2 = wave.open(os.path.abspath(ARG_INTR_AUDIO_FILE), 'rb')
-    audio_samples2 = edit_audio.get_volume_strided(audio_proc2, 1 / framerate, -1, -1)
-    audio_samples2 = [abs(x) / 32768 for x in audio_samples2] # normalize scale between 0 and 1
-    audio_samples2 = [x / max(audio_samples2) for x in audio_samples2] # normalize data between 0 and 1
-    audio_samples2 = [0 if x < 0.2 else 1 for x in audio_samples2]
-    audio_samples2 = edit_audio.smooth_kernel(audio_samples2, 10)
-    audio_samples2 = [max(0.0075, x * 0.05) for x in audio_samples2] # scale down and clamp to min
+    # keyed on the frame rate the scene renders at
+    cache = envelope_cache.EnvelopeCache(ARG_ENVELOPE_CACHE_DIR, ARG_ENVELOPE_CACHE_MAX_BYTES) if ARG_ENVELOPE_CACHE_DIR else None
+    audio_samples1 = load_speech_envelope(ARG_MAIN_AUDIO_FILE, framerate, cache)
+    audio_samples2 = load_speech_envelope(ARG_INTR_AUDIO_FILE, framerate, cache)
     
     if ARG_BUBBLE == True:
         bubble1 = create_scene.add_speechbubble(0.75)
         bubble2 = create_scene.add_speechbubble(-0.75)
         
-        for i in range(ARG_DURATION_IN_FRAMES):
-            start_frame = i * framerate
-            end_frame = (i + 1) * framerate
-            if i < len(audio_samples1):
-                a1s = audio_samples1[i]
-                a2s = audio_samples2[i]
-            else:
-                a1s = audio_samples1[-1]
-                a2s = audio_samples2[-1]
-            
-            bubble1.scale = (a1s, a1s, a1s)
-            bubble1.keyframe_insert(data_path='scale', frame=i)
-            
-            bubble2.scale = (a2s, a2s, a2s)
-            bubble2.keyframe_insert(data_path='scale', frame=i)
+        # one key per frame, past the end of the main agent audio both hold their last value
+        frames = np.arange(ARG_DURATION_IN_FRAMES)
+        in_audio = frames < len(audio_samples1)
+        a1s = np.asarray(audio_samples1)[np.where(in_audio, frames, len(audio_samples1) - 1)]
+        a2s = np.asarray(audio_samples2)[np.where(in_audio, frames, len(audio_samples2) - 1)]
+        bake_animation.bake_uniform_scale(bubble1, frames, a1s)
+        bake_animation.bake_uniform_scale(bubble2, frames, a2s)
+        if ARG_DURATION_IN_FRAMES > 0:
+            bubble1.scale = (a1s[-1], a1s[-1], a1s[-1])
+            bubble2.scale = (a2s[-1], a2s[-1], a2s[-1])
       
-    # 05/04/2023 fix main camera orientation, fix character rotation and personal cameras
-    if ARG_MODE == "full_body":     CAM_POS = [3.25, 0, 1.8]
-    elif ARG_MODE == "upper_body":  CAM_POS = [0, -2.45, 1.3]
-    MAIN_CAM_ROT = [math.radians(80), 0, math.radians(90)]
-    create_scene.setup_scene(CAM_POS, MAIN_CAM_ROT, bpy.data.objects[OBJ1_friendly_name], bpy.data.objects[OBJ2_friendly_name], MAIN_BVH_NAME, INTR_BVH_NAME)
+    if ARG_TEMPLATE_DIR:
+        bpy.data.objects['Main_cam'].location = CAM_POS
+    else:
+        create_scene.setup_scene(CAM_POS, MAIN_CAM_ROT, bpy.data.objects[OBJ1_friendly_name], bpy.data.objects[OBJ2_friendly_name], MAIN_BVH_NAME, INTR_BVH_NAME)
         
     total_frames1 = bpy.data.objects[MAIN_BVH_NAME].animation_data.action.frame_range.y
     total_frames2 = bpy.data.objects[INTR_BVH_NAME].animation_data.action.frame_range.y
     ARG_DURATION_IN_FRAMES = math.floor(min([ARG_DURATION_IN_FRAMES, total_frames1, total_frames2]))      
-    dyad_fp, main_fp, intr_fp = render_video(str(output_dir), ARG_IMAGE, ARG_VIDEO, output_name, OBJ1_friendly_name, OBJ2_friendly_name, ARG_START_FRAME, ARG_DURATION_IN_FRAMES, ARG_RESOLUTION_X, ARG_RESOLUTION_Y)
-    
-    audio1.use_mono = True
-    audio2.use_mono = True
-    bpy.context.scene.sequence_editor.sequences_all['AudioClip1'].pan = 1
-    bpy.context.scene.sequence_editor.sequences_all['AudioClip2'].pan = -1
-    
-    bvh1_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input1', filepath=intr_fp, channel=3, frame_start=ARG_START_FRAME)
-    bvh1_mp4.mute = True
-    bvh1_mp4.use_proxy = False
-    input1_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input1_effect', type='TRANSFORM', channel=4, frame_start=ARG_START_FRAME, seq1=bvh1_mp4)
-    input1_effect.use_uniform_scale = True
-    input1_effect.transform.offset_x = -350
-    input1_effect.transform.offset_y = 30
-    input1_effect.transform.scale_y = 1.000001
-    input1_effect.blend_type = 'ALPHA_OVER'
-    input1_effect.crop.max_x = 300
-    input1_effect.crop.min_x = 300
+    dyad_fp, main_fp, intr_fp = render_video(str(output_dir), ARG_IMAGE, ARG_VIDEO, output_name, OBJ1_friendly_name, OBJ2_friendly_name, ARG_START_FRAME, ARG_DURATION_IN_FRAMES, ARG_RESOLUTION_X, ARG_RESOLUTION_Y, render_passes(ARG_VIEWS, ARG_SINGLE_PASS))
     
-    bvh2_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input2', filepath=main_fp, channel=5, frame_start=ARG_START_FRAME)
-    bvh2_mp4.mute = True
-    bvh2_mp4.use_proxy = False
-    input2_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input2_effect', type='TRANSFORM', channel=6, frame_start=ARG_START_FRAME, seq1=bvh2_mp4)
-    input2_effect.use_uniform_scale = True
-    input2_effect.transform.offset_x = 350
-    input2_effect.transform.offset_y = 30
-    input2_effect.transform.scale_y = 1.000001
-    input2_effect.blend_type = 'ALPHA_OVER'
-    input2_effect.crop.max_x = 300
-    input2_effect.crop.min_x = 300
+    if 'composite' in ARG_VIEWS:
+        audio1.use_mono = True
+        audio2.use_mono = True
+        bpy.context.scene.sequence_editor.sequences_all['AudioClip1'].pan = 1
+        bpy.context.scene.sequence_editor.sequences_all['AudioClip2'].pan = -1
+        
+        if ARG_SINGLE_PASS:
+            create_compositor.setup_single_pass(OBJ1_friendly_name, OBJ2_friendly_name, ARG_RESOLUTION_X, ARG_RESOLUTION_Y, os.path.join(str(output_dir), f'{output_name}_labels.png'))
+        elif ARG_IMAGE or not ARG_FFMPEG_COMPOSITE:
+            bvh1_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input1', filepath=intr_fp, channel=3, frame_start=ARG_START_FRAME)
+            bvh1_mp4.mute = True
+            bvh1_mp4.use_proxy = False
+            input1_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input1_effect', type='TRANSFORM', channel=4, frame_start=ARG_START_FRAME, seq1=bvh1_mp4)
+            input1_effect.use_uniform_scale = True
+            input1_effect.transform.offset_x = -350
+            input1_effect.transform.offset_y = 30
+            input1_effect.transform.scale_y = 1.000001
+            input1_effect.blend_type = 'ALPHA_OVER'
+            input1_effect.crop.max_x = 300
+            input1_effect.crop.min_x = 300
     
-    main_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input3', filepath=dyad_fp, channel=7, frame_start=ARG_START_FRAME)
-    main_mp4.mute = True
-    main_mp4.use_proxy = False
-    input3_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input3_effect', type='TRANSFORM', channel=8, frame_start=ARG_START_FRAME, seq1=main_mp4)
-    input3_effect.use_uniform_scale = True
-    input3_effect.scale_start_x = 0.225
-    input3_effect.transform.offset_x = 0
-    input3_effect.transform.offset_y = -249
-    input3_effect.blend_type = 'ALPHA_OVER'
-#    input3_effect.color_multiply = 1.05
-    input3_effect.crop.max_y = 0
-    input3_effect.crop.min_y = 0
-    input3_effect.crop.max_x = 450
-    input3_effect.crop.min_x = 450
+            bvh2_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input2', filepath=main_fp, channel=5, frame_start=ARG_START_FRAME)
+            bvh2_mp4.mute = True
+            bvh2_mp4.use_proxy = False
+            input2_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input2_effect', type='TRANSFORM', channel=6, frame_start=ARG_START_FRAME, seq1=bvh2_mp4)
+            input2_effect.use_uniform_scale = True
+            input2_effect.transform.offset_x = 350
+            input2_effect.transform.offset_y = 30
+            input2_effect.transform.scale_y = 1.000001
+            input2_effect.blend_type = 'ALPHA_OVER'
+            input2_effect.crop.max_x = 300
+            input2_effect.crop.min_x = 300
     
-    text_actor1 = bpy.context.scene.sequence_editor.sequences.new_effect(name='Main_Agent',type='TEXT', channel=9, frame_start=ARG_START_FRAME, frame_end=ARG_START_FRAME + ARG_DURATION_IN_FRAMES + 1)
-    text_actor1.font_size = 30
-    text_actor1.location[0] = 0.92
-    text_actor1.location[1] = 0.11
-    text_actor1.text = "Main Agent"
+            main_mp4 = bpy.context.scene.sequence_editor.sequences.new_movie(name='input3', filepath=dyad_fp, channel=7, frame_start=ARG_START_FRAME)
+            main_mp4.mute = True
+            main_mp4.use_proxy = False
+            input3_effect = bpy.context.scene.sequence_editor.sequences.new_effect(name='input3_effect', type='TRANSFORM', channel=8, frame_start=ARG_START_FRAME, seq1=main_mp4)
+            input3_effect.use_uniform_scale = True
+            input3_effect.scale_start_x = 0.225
+            input3_effect.transform.offset_x = 0
+            input3_effect.transform.offset_y = -249
+            input3_effect.blend_type = 'ALPHA_OVER'
+#            input3_effect.color_multiply = 1.05
+            input3_effect.crop.max_y = 0
+            input3_effect.crop.min_y = 0
+            input3_effect.crop.max_x = 450
+            input3_effect.crop.min_x = 450
     
-    text_actor2 = bpy.context.scene.sequence_editor.sequences.new_effect(name='Interlocutor',type='TEXT', channel=10, frame_start=ARG_START_FRAME, frame_end=ARG_START_FRAME + ARG_DURATION_IN_FRAMES + 1)
-    text_actor2.font_size = 30
-    text_actor2.location[0] = 0.10
-    text_actor2.location[1] = 0.11
-    text_actor2.text = "Interlocutor"
+            text_actor1 = bpy.context.scene.sequence_editor.sequences.new_effect(name='Main_Agent',type='TEXT', channel=9, frame_start=ARG_START_FRAME, frame_end=ARG_START_FRAME + ARG_DURATION_IN_FRAMES + 1)
+            text_actor1.font_size = 30
+            text_actor1.location[0] = 0.92
+            text_actor1.location[1] = 0.11
+            text_actor1.text = "Main Agent"
     
-    if ARG_VIDEO == True:
-        seq_filepath = os.path.join(str(output_dir), f'{output_name}.mp4')
-        bpy.context.scene.render.filepath = seq_filepath
-        bpy.context.scene.render.resolution_y = ARG_RESOLUTION_Y + 50
-        bpy.ops.render.render(animation=True)
+            text_actor2 = bpy.context.scene.sequence_editor.sequences.new_effect(name='Interlocutor',type='TEXT', channel=10, frame_start=ARG_START_FRAME, frame_end=ARG_START_FRAME + ARG_DURATION_IN_FRAMES + 1)
+            text_actor2.font_size = 30
+            text_actor2.location[0] = 0.10
+            text_actor2.location[1] = 0.11
+            text_actor2.text = "Interlocutor"
+        
+        if ARG_VIDEO == True and ARG_FFMPEG_COMPOSITE and not ARG_SINGLE_PASS:
+            seq_filepath = os.path.join(str(output_dir), f'{output_name}.mp4')
+            composite_start = time.time()
+            # the audio is left to the server, like with the sequencer
+            compose_video.compose(intr_fp, main_fp, dyad_fp, seq_filepath, ARG_RESOLUTION_X, ARG_RESOLUTION_Y, framerate,
+                main_audio=ARG_MAIN_AUDIO_FILE if not IS_SERVER else None, intr_audio=ARG_INTR_AUDIO_FILE if not IS_SERVER else None, start_frame=ARG_START_FRAME)
+            print("composite_time", round(time.time() - composite_start, 3), flush=True)
+        elif ARG_VIDEO == True:
+            seq_filepath = os.path.join(str(output_dir), f'{output_name}.mp4')
+            bpy.context.scene.render.filepath = seq_filepath
+            bpy.context.scene.render.resolution_y = ARG_RESOLUTION_Y + 50
+            composite_start = time.time()
+            bpy.ops.render.render(animation=True)
+            print("composite_time", round(time.time() - composite_start, 3), flush=True)
     
-    if ARG_IMAGE == True:
-        bpy.context.scene.render.image_settings.file_format='PNG'
-        seq_filepath = os.path.join(str(output_dir), f'{output_name}.png')
-        bpy.context.scene.render.filepath = seq_filepath
-        bpy.context.scene.render.resolution_y = ARG_RESOLUTION_Y + 50
-        bpy.ops.render.render(write_still=True)
+        if ARG_IMAGE == True:
+            bpy.context.scene.render.image_settings.file_format='PNG'
+            seq_filepath = os.path.join(str(output_dir), f'{output_name}.png')
+            bpy.context.scene.render.filepath = seq_filepath
+            bpy.context.scene.render.resolution_y = ARG_RESOLUTION_Y + 50
+            bpy.ops.render.render(write_still=True)
     
     end = time.time()
     all_time = end - start
-    print("output_file", str(list(output_dir.glob("*"))[0]), flush=True)
+    if ARG_VIDEO == True:
+        outputs = {'main-agent': main_fp, 'interloctr': intr_fp, 'dyadic': dyad_fp, 'composite': os.path.join(str(output_dir), f'{output_name}.mp4')}
+        print("output_file", outputs['composite'] if 'composite' in ARG_VIEWS else outputs[ARG_VIEWS[0]], flush=True)
+    else:
+        print("output_file", str(list(output_dir.glob("*"))[0]), flush=True)
     print(all_time)
 
 #Code line
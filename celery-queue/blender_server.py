@@ -0,0 +1,51 @@
+import sys
+import os
+import bpy
+import json
+import ctypes
+import runpy
+import traceback
+
+# Runs inside a long-lived Blender process (see render_server.py). Every line on
+# stdin is a JSON job {"script": ..., "args": [...]}; the script is executed as
+# if Blender had been started with "--python <script> -- <args>", on a freshly
+# reset scene. The end of every job is marked by a line on stdout.
+JOB_DONE = "render_server_done"
+JOB_FAILED = "render_server_failed"
+
+BLENDER_ARGV = sys.argv[:sys.argv.index("--")] if "--" in sys.argv else list(sys.argv)
+libc = ctypes.CDLL(None)
+
+def reset_scene():
+    # the same pristine state a cold "blender -b" starts from
+    bpy.ops.wm.read_factory_settings()
+
+def run_job(job):
+    saved_path = list(sys.path)
+    saved_cwd = os.getcwd()
+    sys.argv = BLENDER_ARGV + ["--"] + [str(arg) for arg in job["args"]]
+    try:
+        reset_scene()
+        runpy.run_path(job["script"], run_name="__main__")
+    finally:
+        sys.path[:] = saved_path
+        os.chdir(saved_cwd)
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            run_job(json.loads(line))
+        except BaseException: # argparse errors end in SystemExit
+            status = JOB_FAILED + " " + json.dumps(traceback.format_exc())
+        else:
+            status = JOB_DONE
+        sys.stdout.flush()
+        # Blender's own C-level output ("Append frame ...") is block buffered on a
+        # pipe, it has to be out before the end marker
+        libc.fflush(None)
+        print(status, flush=True)
+
+#Code line
+main()
@@ -0,0 +1,40 @@
+import sys
+import os
+import bpy
+import math
+import time
+import argparse
+import importlib
+from pathlib import Path as myPath
+
+script_dir = myPath(os.path.realpath(__file__)).parents[0]
+sys.path.append(os.path.join(script_dir, "scripts"))
+
+import scene_template
+importlib.reload(scene_template)
+
+# Bakes the motion independent part of the blender_render_2023.py scene into a
+# versioned template, e.g. as a build step:
+# blender -b --python build_scene_template.py -- -t <template directory>
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Builds the scene template used by blender_render_2023.py --template_dir.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-t', '--template_dir', help='Directory to save the template in.', type=myPath, default=script_dir / 'templates')
+    argv = sys.argv
+    argv = argv[argv.index("--") + 1 :] if "--" in argv else []
+    return vars(parser.parse_args(args=argv))
+
+def main():
+    args = parse_args()
+    path = scene_template.template_path(args['template_dir'].resolve(), script_dir)
+    if os.path.exists(path):
+        print("scene_template", path, "is up to date", flush=True)
+        return
+    start = time.time()
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene_template.build_static_content(script_dir, [math.radians(80), 0, math.radians(90)])
+    scene_template.save_template(path)
+    print("scene_template", path, "built in", round(time.time() - start, 3), flush=True)
+
+#Code line
+main()
@@ -0,0 +1,102 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import json
+import subprocess
+from collections import deque
+from typing import Callable, Iterator, List, Optional
+
+SERVER_SCRIPT = "blender_server.py"
+JOB_DONE = "render_server_done"
+JOB_FAILED = "render_server_failed"
+ERROR_TAIL_LINES = 50
+
+
+class RenderServerError(Exception):
+	pass
+
+
+class RenderServer:
+	# Keeps one Blender process alive between jobs, so a job does not pay for the
+	# Blender startup and the Python imports. Jobs are written as JSON lines to
+	# its stdin and blender_server.py resets the scene before running each one.
+	# The process is restarted after max_jobs jobs, or once its resident memory
+	# grows past max_rss bytes (0 disables the check), and whenever it dies.
+	# popen_kwargs is called before every start, for the environment of the process.
+	def __init__(self, blender: str, max_jobs: int, max_rss: int = 0, blender_args: List[str] = None, popen_kwargs: Callable[[], dict] = dict):
+		self.blender = blender
+		self.max_jobs = max_jobs
+		self.max_rss = max_rss
+		self.blender_args = blender_args or []
+		self.popen_kwargs = popen_kwargs
+		self.process: Optional[subprocess.Popen] = None
+		self.jobs = 0
+
+	def start(self):
+		self.process = subprocess.Popen(
+			[self.blender, "-b"] + self.blender_args + ["--python", SERVER_SCRIPT],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			**self.popen_kwargs(),
+		)
+		self.jobs = 0
+
+	def stop(self):
+		if self.process is None:
+			return
+		process, self.process = self.process, None
+		try:
+			process.stdin.close()
+			process.wait(timeout=10)
+		except (OSError, subprocess.TimeoutExpired):
+			process.kill()
+			process.wait()
+
+	def rss(self) -> int:
+		try:
+			with open(f"/proc/{self.process.pid}/status") as status:
+				for line in status:
+					if line.startswith("VmRSS:"):
+						return int(line.split()[1]) * 1024
+		except OSError:
+			pass
+		return 0
+
+	def recycle(self):
+		if self.jobs >= self.max_jobs or (self.max_rss > 0 and self.rss() > self.max_rss):
+			self.stop()
+
+	def run(self, script: str, script_args: List[str]) -> Iterator[str]:
+		# yields the output lines of the job until it is done, abandoning the
+		# iterator early restarts the process
+		if self.process is None or self.process.poll() is not None:
+			self.start()
+		tail = deque(maxlen=ERROR_TAIL_LINES)
+		done = False
+		try:
+			self.process.stdin.write((json.dumps({"script": script, "args": [str(arg) for arg in script_args]}) + "\n").encode("utf-8"))
+			self.process.stdin.flush()
+			for line in self.process.stdout:
+				line = line.decode("utf-8", "replace").strip()
+				if line == JOB_DONE:
+					done = True
+					break
+				if line.startswith(JOB_FAILED):
+					done = True
+					raise RenderServerError(json.loads(line[len(JOB_FAILED):]))
+				tail.append(line)
+				yield line
+			else:
+				raise RenderServerError("\n".join(tail) or "The Blender process exited unexpectedly")
+		finally:
+			self.jobs += 1
+			if done:
+				self.recycle()
+			else:
+				# died, or the job was abandoned half way: its output can not be skipped reliably
+				self.stop()
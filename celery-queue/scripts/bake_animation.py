@@ -0,0 +1,46 @@
+import bpy
+import numpy as np
+
+# Writes per-frame values to F-curves in bulk: the keyframe points of every
+# curve are allocated with one add() call and filled from an array with one
+# foreach_set(), instead of one keyframe_insert() (and F-curve update) per
+# frame and channel. The keys get the keyframe_insert() defaults, bezier
+# interpolation with auto clamped handles, which update() recalculates.
+
+def get_action(id_data):
+    if id_data.animation_data is None:
+        id_data.animation_data_create()
+    if id_data.animation_data.action is None:
+        id_data.animation_data.action = bpy.data.actions.new(name=id_data.name + 'Action')
+    return id_data.animation_data.action
+
+def bake_fcurve(action, data_path, index, frames, values, group=None):
+    # replaces the keys of one F-curve with (frame, value) pairs
+    fcurve = action.fcurves.find(data_path, index=index)
+    if fcurve is not None:
+        action.fcurves.remove(fcurve)
+    if group is None:
+        fcurve = action.fcurves.new(data_path, index=index)
+    else:
+        fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+    co = np.empty(2 * len(frames), dtype=np.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    fcurve.keyframe_points.add(len(frames))
+    fcurve.keyframe_points.foreach_set('co', co)
+    fcurve.update()
+    return fcurve
+
+def bake_property(id_data, data_path, frames, values, group=None):
+    # values has one row per frame and one column per array index of the
+    # property (a 1D array for a single value property)
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim == 1:
+        values = values[:, None]
+    action = get_action(id_data)
+    return [bake_fcurve(action, data_path, index, frames, values[:, index], group) for index in range(values.shape[1])]
+
+def bake_uniform_scale(obj, frames, scales):
+    # the same scale on all three axes of obj for every frame
+    scales = np.asarray(scales, dtype=np.float32)
+    return bake_property(obj, 'scale', frames, np.repeat(scales[:, None], 3, axis=1), 'Object Transforms')
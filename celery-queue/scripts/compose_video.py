@@ -0,0 +1,105 @@
+import time
+import argparse
+import subprocess
+
+# Builds the dyadic composite of blender_render_2023.py (interlocutor on the
+# left, main agent on the right, the dyadic view small at the bottom and the
+# two labels) from the three rendered views with one ffmpeg filter graph, and
+# muxes the panned audio of both speakers in the same pass. The layout follows
+# the sequencer strips of the render script: the canvas is 50 px taller than
+# the views, the personal views lose 300 px on both sides and are moved 350 px
+# sideways and 30 px up, the dyadic view loses 450 px on both sides and is
+# scaled by 0.225 and moved 249 px down.
+
+LABEL_HEIGHT = 50
+SIDE_CROP = 300
+SIDE_OFFSET = 350
+SIDE_RAISE = 30
+DYADIC_CROP = 450
+DYADIC_SCALE = 0.225
+DYADIC_DROP = 249
+LABEL_FONT_SIZE = 30
+# (text, horizontal center, bottom) as fractions of the canvas, like the sequencer text strips
+LABELS = [("Main Agent", 0.92, 0.11), ("Interlocutor", 0.10, 0.11)]
+
+def quote(value):
+    # quoted filter option value, only the quote itself needs escaping
+    return "'" + str(value).replace("'", "'\\''") + "'"
+
+def filter_graph(res_x, res_y, fps, main_audio=False, intr_audio=False, font_file=None):
+    # inputs: 0 interlocutor view, 1 main agent view, 2 dyadic view, then the main agent and interlocutor audio
+    width = res_x
+    height = res_y + LABEL_HEIGHT
+    graph = [
+        f"color=c=black:s={width}x{height}:r={fps}[bg]",
+        f"[0:v]crop=iw-{2 * SIDE_CROP}:ih:{SIDE_CROP}:0[intr]",
+        f"[1:v]crop=iw-{2 * SIDE_CROP}:ih:{SIDE_CROP}:0[main]",
+        f"[2:v]crop=iw-{2 * DYADIC_CROP}:ih:{DYADIC_CROP}:0,scale=iw*{DYADIC_SCALE}:ih*{DYADIC_SCALE}[dyad]",
+        f"[bg][intr]overlay=x=(W-w)/2-{SIDE_OFFSET}:y=(H-h)/2-{SIDE_RAISE}:shortest=1[v1]",
+        f"[v1][main]overlay=x=(W-w)/2+{SIDE_OFFSET}:y=(H-h)/2-{SIDE_RAISE}[v2]",
+        f"[v2][dyad]overlay=x=(W-w)/2:y=(H-h)/2+{DYADIC_DROP}[v3]",
+    ]
+    font = f":fontfile={quote(font_file)}" if font_file else ""
+    labels = ",".join(
+        f"drawtext=text={quote(text)}{font}:fontsize={LABEL_FONT_SIZE}:fontcolor=white:x={x}*w-text_w/2:y=h-{y}*h-text_h"
+        for text, x, y in LABELS
+    )
+    graph.append(f"[v3]{labels}[v]")
+
+    # both speakers are downmixed to mono, the main agent goes right and the interlocutor left
+    audio_input = 3
+    if main_audio:
+        graph.append(f"[{audio_input}:a]aformat=channel_layouts=mono[a_main]")
+        audio_input += 1
+    if intr_audio:
+        graph.append(f"[{audio_input}:a]aformat=channel_layouts=mono[a_intr]")
+    if main_audio and intr_audio:
+        graph.append("[a_intr][a_main]join=inputs=2:channel_layout=stereo:map=0.0-FL|1.0-FR[a]")
+    elif main_audio:
+        graph.append("[a_main]pan=stereo|FL=0*c0|FR=c0[a]")
+    elif intr_audio:
+        graph.append("[a_intr]pan=stereo|FL=c0|FR=0*c0[a]")
+    return ";".join(graph)
+
+def build_command(intr_video, main_video, dyad_video, output_file, res_x, res_y, fps=30, main_audio=None, intr_audio=None, font_file=None, ffmpeg='ffmpeg', start_frame=0):
+    command = [ffmpeg, '-y', '-i', str(intr_video), '-i', str(main_video), '-i', str(dyad_video)]
+    for audio in [main_audio, intr_audio]:
+        if audio:
+            # the sound strips start at frame 0, the views at start_frame
+            if start_frame:
+                command += ['-ss', '{:.6f}'.format(start_frame / fps)]
+            command += ['-i', str(audio)]
+    command += ['-filter_complex', filter_graph(res_x, res_y, fps, bool(main_audio), bool(intr_audio), font_file), '-map', '[v]']
+    command += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20', '-pix_fmt', 'yuv420p', '-g', '30']
+    if main_audio or intr_audio:
+        command += ['-map', '[a]', '-c:a', 'aac', '-shortest']
+    command.append(str(output_file))
+    return command
+
+def compose(intr_video, main_video, dyad_video, output_file, res_x, res_y, fps=30, main_audio=None, intr_audio=None, font_file=None, ffmpeg='ffmpeg', start_frame=0):
+    command = build_command(intr_video, main_video, dyad_video, output_file, res_x, res_y, fps, main_audio, intr_audio, font_file, ffmpeg, start_frame)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace'))
+    return output_file
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Composites the views rendered by blender_render_2023.py into the dyadic stimulus video.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-ii', '--input_intr', help='Interlocutor view video.', required=True)
+    parser.add_argument('-im', '--input_main', help='Main agent view video.', required=True)
+    parser.add_argument('-id', '--input_dyad', help='Dyadic view video.', required=True)
+    parser.add_argument('-imw', '--input_main_wav', help='Main agent WAV audio file.')
+    parser.add_argument('-iiw', '--input_intr_wav', help='Interlocutor WAV audio file.')
+    parser.add_argument('-o', '--output', help='Output video file.', required=True)
+    parser.add_argument('-rx', '--res_x', help='The horizontal resolution of the views.', type=int, default=1280)
+    parser.add_argument('-ry', '--res_y', help='The vertical resolution of the views.', type=int, default=720)
+    parser.add_argument('-f', '--fps', help='Frame rate of the views.', type=int, default=30)
+    parser.add_argument('-s', '--start', help='The frame the views start at, the audio is cut to start there too.', type=int, default=0)
+    parser.add_argument('--font_file', help='Font for the labels, the ffmpeg default is used if not given.')
+    return vars(parser.parse_args())
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.time()
+    compose(args['input_intr'], args['input_main'], args['input_dyad'], args['output'], args['res_x'], args['res_y'], args['fps'], args['input_main_wav'], args['input_intr_wav'], args['font_file'], start_frame=args['start'])
+    print("composite_time", round(time.time() - start, 3))
@@ -0,0 +1,114 @@
+import bpy
+
+# Single pass layout of the dyadic composite: instead of rendering the three
+# camera views one after another and compositing them in the sequencer, every
+# view is a linked copy of the scene with its own camera, fed to the compositor
+# of the main scene, so each frame of every view is rendered in one animation
+# pass. The character a view hides is excluded through its own collection.
+# The views are rendered at the composite size (res_y + 50); the cameras fit the
+# width, so that only adds 25 rows above and below, which are cropped off.
+
+LABEL_HEIGHT = 50
+
+def move_to_collection(obj, name):
+    collection = bpy.data.collections.new(name)
+    bpy.context.scene.collection.children.link(collection)
+    for owner in list(obj.users_collection):
+        owner.objects.unlink(obj)
+    collection.objects.link(obj)
+    return collection
+
+def add_view_scene(scene, name, camera, hidden_collection):
+    view_scene = scene.copy()
+    view_scene.name = name
+    view_scene.camera = bpy.data.objects[camera]
+    for view_layer in view_scene.view_layers:
+        view_layer.layer_collection.children[hidden_collection].exclude = True
+    return view_scene
+
+def render_labels(scene, filepath):
+    # the "Main Agent" / "Interlocutor" text strips never change, they are rendered once as a transparent still
+    labels = bpy.data.scenes.new('Labels')
+    labels.render.resolution_x = scene.render.resolution_x
+    labels.render.resolution_y = scene.render.resolution_y
+    labels.render.resolution_percentage = scene.render.resolution_percentage
+    labels.render.film_transparent = True
+    labels.render.image_settings.file_format = 'PNG'
+    labels.render.image_settings.color_mode = 'RGBA'
+    labels.sequence_editor_create()
+    for channel, (name, text, x) in enumerate([('Main_Agent', "Main Agent", 0.92), ('Interlocutor', "Interlocutor", 0.10)]):
+        text_actor = labels.sequence_editor.sequences.new_effect(name=name, type='TEXT', channel=channel + 1, frame_start=1, frame_end=2)
+        text_actor.font_size = 30
+        text_actor.location[0] = x
+        text_actor.location[1] = 0.11
+        text_actor.text = text
+    labels.frame_current = 1
+    labels.render.filepath = filepath
+    bpy.ops.render.render(write_still=True, scene=labels.name)
+    return bpy.data.images.load(filepath)
+
+def setup_single_pass(actor1, actor2, res_x, res_y, labels_filepath):
+    scene = bpy.context.scene
+    scene.render.resolution_y = res_y + LABEL_HEIGHT
+    move_to_collection(bpy.data.objects[actor1].children[1], actor1 + '_mesh')
+    move_to_collection(bpy.data.objects[actor2].children[1], actor2 + '_mesh')
+    intr_scene = add_view_scene(scene, 'View_interloctr', actor2 + '_cam', actor1 + '_mesh')
+    main_scene = add_view_scene(scene, 'View_main-agent', actor1 + '_cam', actor2 + '_mesh')
+    scene.camera = bpy.data.objects['Main_cam']
+    labels_image = render_labels(scene, labels_filepath)
+
+    scene.use_nodes = True
+    tree = scene.node_tree
+    for node in list(tree.nodes):
+        tree.nodes.remove(node)
+
+    def render_layers(view_scene):
+        node = tree.nodes.new('CompositorNodeRLayers')
+        node.scene = view_scene
+        return node.outputs['Image']
+
+    def crop(image, margin_x):
+        # cuts the res_x x res_y frame (less margin_x on both sides) out of the taller view
+        node = tree.nodes.new('CompositorNodeCrop')
+        node.use_crop_size = False
+        node.relative = False
+        node.min_x = margin_x
+        node.max_x = res_x - margin_x
+        node.min_y = LABEL_HEIGHT // 2
+        node.max_y = LABEL_HEIGHT // 2 + res_y
+        tree.links.new(image, node.inputs['Image'])
+        return node.outputs['Image']
+
+    def scale(image, factor):
+        node = tree.nodes.new('CompositorNodeScale')
+        node.space = 'RELATIVE'
+        node.inputs['X'].default_value = factor
+        node.inputs['Y'].default_value = factor
+        tree.links.new(image, node.inputs['Image'])
+        return node.outputs['Image']
+
+    def translate(image, x, y):
+        node = tree.nodes.new('CompositorNodeTranslate')
+        node.inputs['X'].default_value = x
+        node.inputs['Y'].default_value = y
+        tree.links.new(image, node.inputs['Image'])
+        return node.outputs['Image']
+
+    def alpha_over(background, foreground):
+        node = tree.nodes.new('CompositorNodeAlphaOver')
+        if background is None:
+            node.inputs[1].default_value = (0, 0, 0, 1)
+        else:
+            tree.links.new(background, node.inputs[1])
+        tree.links.new(foreground, node.inputs[2])
+        return node.outputs['Image']
+
+    # same offsets as the sequencer layout in blender_render_2023.py
+    image = alpha_over(None, translate(crop(render_layers(intr_scene), 300), -350, 30))
+    image = alpha_over(image, translate(crop(render_layers(main_scene), 300), 350, 30))
+    image = alpha_over(image, translate(scale(crop(render_layers(scene), 450), 0.225), 0, -249))
+    labels = tree.nodes.new('CompositorNodeImage')
+    labels.image = labels_image
+    image = alpha_over(image, labels.outputs['Image'])
+    composite = tree.nodes.new('CompositorNodeComposite')
+    tree.links.new(image, composite.inputs['Image'])
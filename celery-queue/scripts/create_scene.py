@@ -13,6 +13,12 @@ import create_camera
 importlib.reload(create_camera)
 
 def setup_scene(cam_pos, cam_rot, actor1, actor2, arm1, arm2, plane_size=5):
+    arm1 = bpy.data.objects[arm1]
+    arm2 = bpy.data.objects[arm2]
+    setup_static_scene(cam_pos, cam_rot, actor1, actor2, plane_size)
+
+# everything that does not depend on the motion, also used to build the scene template
+def setup_static_scene(cam_pos, cam_rot, actor1, actor2, plane_size=5):
     
     # Camera Main
     name = 'Main'
@@ -21,12 +27,10 @@ def setup_scene(cam_pos, cam_rot, actor1, actor2, arm1, arm2, plane_size=5):
     # Camera actor 1
     actor1c = actor1.children[0]
     actor1c.name = 'actor1_loc'
-    arm1 = bpy.data.objects[arm1]
     
     # Camera actor 2
     actor2c = actor2.children[0]
     actor2c.name = 'actor2_loc'
-    arm2 = bpy.data.objects[arm2]
     
     cam_pos = [0, 0.75, 1.5]
     cam_rot = [math.radians(80), 0, math.radians(180)]
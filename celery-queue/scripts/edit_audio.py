@@ -1,7 +1,9 @@
-import bpy
 import math
 import numpy as np
 
+# the speech bubble of blender_render_2023.py
+SPEECH_ENVELOPE_PARAMS = {'threshold': 0.2, 'offset': 10, 'scale': 0.05, 'minimum': 0.0075}
+
 def read_audio_strided(audio, stride, start, stop):
     rate = audio.getframerate()
     if start < 0: start = 0 # seconds
@@ -46,6 +48,60 @@ def get_volume_strided(audio, stride, start, stop):
     volumes = [get_volume(audio, t) for t in times]
     return volumes
 
+def read_first_channel(audio):
+    # the whole file at once, keeping only the first 16 bits of every frame like readframes(1) above
+    nframes = audio.getnframes()
+    if audio.getnchannels() * audio.getsampwidth() % 2:
+        # np.frombuffer(..., dtype=np.int16) of a single frame fails the same way
+        raise ValueError("buffer size must be a multiple of element size")
+    audio.setpos(0)
+    frames = np.frombuffer(audio.readframes(nframes), dtype=np.uint8)
+    frames = frames[:nframes * audio.getnchannels() * audio.getsampwidth()].reshape(nframes, -1)
+    return np.ascontiguousarray(frames[:, :2]).view('<i2')[:, 0]
+
+def frame_times(start, stop, stride):
+    # the times of get_volume_strided: start + stride * i up to and including the first one >= stop
+    if start >= stop:
+        return np.empty(0)
+    count = math.ceil((stop - start) / stride) + 2
+    times = start + stride * np.arange(count)
+    while times[-1] < stop:
+        count *= 2
+        times = start + stride * np.arange(count)
+    return times[:np.argmax(times >= stop) + 1]
+
+def get_volume_envelope(audio, stride, start, stop):
+    # same envelope as get_volume_strided, with the audio read once
+    return volume_envelope(read_first_channel(audio), audio.getframerate(), stride, start, stop)
+
+def volume_envelope(samples, rate, stride, start, stop):
+    # the envelope of get_volume_strided from one channel of 16 bit samples
+    # (WavFile.int16), with the peak of every window taken in one gather, so
+    # only the sampled positions of a memory-mapped file are read
+    nframes = len(samples)
+    if start < 0: start = 0
+    if stop  < 0: stop = nframes / rate
+    times = frame_times(start, stop, stride)
+
+    # the window bounds of read_audio_strided, as called by get_volume
+    time_range = 0.01
+    sample_stride = math.floor(0.001 * rate)
+    window_start = np.floor(np.maximum(times - time_range, 0) * rate).astype(np.int64)
+    window_stop = np.floor((times + time_range) * rate).astype(np.int64)
+    window_start[window_start > nframes] = nframes - 1
+    window_stop = np.minimum(window_stop, nframes)
+    counts = -((window_start - window_stop) // sample_stride) # ceil of the duration in strides
+    counts = np.minimum(counts, -((window_start - nframes) // sample_stride)) # positions past the end are skipped
+    if len(times) and counts.min() <= 0:
+        raise ValueError("max() arg is an empty sequence")
+
+    width = int(counts.max()) if len(times) else 0
+    steps = np.arange(width)
+    positions = window_start[:, None] + sample_stride * steps[None, :]
+    inside = steps[None, :] < counts[:, None]
+    window = np.where(inside, np.abs(samples[np.where(inside, positions, 0)]), np.iinfo(np.int16).min)
+    return list(window.max(axis=1)) if len(times) else []
+
 def smooth_kernel(data, offset=5):
     out_data = []
     for i in range(len(data)):
@@ -56,4 +112,33 @@ def smooth_kernel(data, offset=5):
             if data[j] > 0:
                 out_data[-1] = 1
                 break
-    return out_data
\ No newline at end of file
+    return out_data
+
+def sliding_max(data, offset):
+    # max over [i - offset, i + offset] (clipped to the data) for every i, in
+    # linear time: the maximum of the suffix of one block of the window width
+    # and the prefix of the next one (van Herk / Gil-Werman)
+    data = np.asarray(data, dtype=np.float64)
+    width = 2 * offset + 1
+    blocks = math.ceil((len(data) + 2 * offset) / width)
+    padded = np.full(blocks * width, -np.inf)
+    padded[offset:offset + len(data)] = data
+    padded = padded.reshape(blocks, width)
+    prefix = np.maximum.accumulate(padded, axis=1).ravel()
+    suffix = np.maximum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:len(data)], prefix[width - 1:width - 1 + len(data)])
+
+def speech_envelope(volumes, threshold=0.2, offset=10, scale=0.05, minimum=0.0075):
+    # the speech bubble scale per frame: the peaks normalized to 0-1, thresholded
+    # to talking or not, widened by offset frames to both sides, then scaled and
+    # clamped to the minimum; the same values smooth_kernel and the list
+    # comprehensions of blender_render_2023.py gave
+    volumes = np.abs(np.asarray(volumes, dtype=np.int16)) / 32768 # normalize scale between 0 and 1
+    peak = volumes.max()
+    if peak == 0:
+        # a silent track never talks (the list version divided by zero here)
+        return np.full(len(volumes), minimum)
+    volumes = volumes / peak # normalize data between 0 and 1
+    talking = np.where(volumes < threshold, 0.0, 1.0)
+    talking = sliding_max(talking, offset)
+    return np.maximum(minimum, talking * scale)
\ No newline at end of file
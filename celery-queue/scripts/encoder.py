@@ -0,0 +1,17 @@
+# The ffmpeg command of the piped encoder (see frame_pipe.py), kept free of bpy
+# so it can be benchmarked outside of Blender.
+
+def encoder_command(output_file, fps, preset, crf, threads, pix_fmt, gop_size=30, ffmpeg='ffmpeg', audio_file=None):
+    command = [
+        ffmpeg, '-y', '-loglevel', 'error', '-nostats',
+        '-f', 'image2pipe', '-framerate', str(fps), '-c:v', 'bmp', '-i', '-',
+    ]
+    if audio_file:
+        # the audio is encoded by the same process while the frames arrive, as the separate mux step would
+        command += ['-i', str(audio_file), '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-shortest']
+    command += [
+        '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-threads', str(threads),
+        '-pix_fmt', pix_fmt, '-g', str(gop_size),
+        str(output_file),
+    ]
+    return command
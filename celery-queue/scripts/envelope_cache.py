@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+
+import edit_audio
+import wav_file
+
+# Speech envelopes are kept as .npy files named after the audio content, the
+# frame rate and the envelope parameters, so the same audio rendered with
+# another BVH is not analysed again. Reading an entry touches it, and the
+# least recently used entries are removed once the directory grows past
+# max_bytes.
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def compute_envelope(audio_file, fps, params=edit_audio.SPEECH_ENVELOPE_PARAMS):
+    # the speech bubble scale per frame
+    audio = wav_file.WavFile(audio_file)
+    volumes = edit_audio.volume_envelope(audio.int16(0), audio.rate, 1 / fps, -1, -1)
+    return edit_audio.speech_envelope(volumes, **params)
+
+class EnvelopeCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def make_key(self, audio_file, fps, params):
+        digest = hashlib.sha256()
+        with open(str(audio_file), 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        fields = [digest.hexdigest(), fps, params]
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, audio_file, fps, params=edit_audio.SPEECH_ENVELOPE_PARAMS):
+        # the path of the envelope file, computing and storing it on a miss
+        path = self.directory / '{}.npy'.format(self.make_key(audio_file, fps, params))
+        try:
+            os.utime(str(path))
+            return path
+        except FileNotFoundError:
+            pass
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # the blender float properties are single precision anyway
+        envelope = compute_envelope(audio_file, fps, params).astype(np.float32)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.directory), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, envelope)
+        os.replace(tmp_path, str(path))
+        self.evict()
+        return path
+
+    def evict(self):
+        entries = []
+        for path in self.directory.glob('*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        # the newest entry, the one just stored, is always kept
+        for _, entry_size, path in entries[:-1]:
+            if size <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
@@ -0,0 +1,59 @@
+import bpy
+import os
+import shutil
+import tempfile
+import subprocess
+import importlib
+
+import encoder
+importlib.reload(encoder)
+
+# Blender's own FFMPEG output encodes on the render thread with fixed settings.
+# FramePipe renders the animation as BMP frames instead (cheap to write and to
+# decode) and streams every frame, as soon as Blender has written it, into a
+# separate ffmpeg process, which encodes on the other cores while the next
+# frame renders. The frames are deleted once they are in the pipe.
+
+class FramePipe:
+    def __init__(self, scene, output_file, preset='superfast', crf=20, threads=0, pix_fmt='yuv420p', gop_size=30, ffmpeg='ffmpeg', audio_file=None):
+        self.scene = scene
+        self.command = encoder.encoder_command(output_file, scene.render.fps, preset, crf, threads, pix_fmt, gop_size, ffmpeg, audio_file)
+        self.process = None
+        self.frame_dir = None
+        self.log = None
+
+    def __enter__(self):
+        self.frame_dir = tempfile.mkdtemp()
+        self.scene.render.image_settings.file_format = 'BMP'
+        self.scene.render.image_settings.color_mode = 'RGB'
+        self.scene.render.filepath = os.path.join(self.frame_dir, 'frame_')
+        # ffmpeg only writes errors, to a file so a full pipe can never block it
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+        bpy.app.handlers.render_write.append(self.write_frame)
+        return self
+
+    def write_frame(self, scene, *args):
+        path = scene.render.frame_path(frame=scene.frame_current)
+        with open(path, 'rb') as frame:
+            shutil.copyfileobj(frame, self.process.stdin)
+        os.remove(path)
+        # the same progress line Blender prints for its own FFMPEG output
+        print("Append frame {}".format(scene.frame_current), flush=True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        bpy.app.handlers.render_write.remove(self.write_frame)
+        try:
+            if exc_type is not None:
+                self.process.kill()
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = self.process.wait()
+            if exc_type is None and returncode != 0:
+                self.log.seek(0)
+                raise RuntimeError('The encoder failed: ' + self.log.read().decode('utf-8', 'replace'))
+        finally:
+            self.log.close()
+            shutil.rmtree(self.frame_dir, ignore_errors=True)
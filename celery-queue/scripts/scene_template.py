@@ -0,0 +1,68 @@
+import bpy
+import os
+import glob
+import hashlib
+import importlib
+
+import load_data
+importlib.reload(load_data)
+import create_scene
+importlib.reload(create_scene)
+import create_material
+importlib.reload(create_material)
+
+TEMPLATE_PREFIX = 'scene_template_'
+ACTOR_NAMES = ['OBJ1', 'OBJ2']
+# the baked position of Main_cam, other modes move it after opening the template
+TEMPLATE_CAM_POS = [3.25, 0, 1.8]
+
+def template_inputs(work_dir):
+    # everything the motion independent content is built from
+    files = glob.glob(os.path.join(work_dir, 'model', '*'))
+    files += glob.glob(os.path.join(work_dir, 'scripts', '*.py'))
+    return sorted(files)
+
+def template_version(work_dir):
+    digest = hashlib.sha256(bpy.app.version_string.encode('utf-8'))
+    for path in template_inputs(work_dir):
+        digest.update(os.path.relpath(path, work_dir).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def template_path(template_dir, work_dir):
+    return os.path.join(str(template_dir), TEMPLATE_PREFIX + template_version(work_dir) + '.blend')
+
+def build_static_content(work_dir, cam_rot):
+    # both characters with their materials, the cameras, the floor and the sky,
+    # built on a cleared scene exactly like the render script does it
+    fbx_model = os.path.join(work_dir, 'model', "GenevaModel_v2_Tpose_Final.fbx")
+    for name in ACTOR_NAMES:
+        load_data.load_fbx(fbx_model, name)
+        create_material.add_materials(work_dir, name)
+    create_scene.setup_static_scene(TEMPLATE_CAM_POS, cam_rot, bpy.data.objects[ACTOR_NAMES[0]], bpy.data.objects[ACTOR_NAMES[1]])
+
+def save_template(path):
+    # textures are packed, so opening the template does not read the JPGs again
+    bpy.ops.file.pack_all()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp.blend'.format(path[:-len('.blend')], os.getpid())
+    bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True, compress=False)
+    os.replace(tmp_path, path)
+    # older versions can not be used anymore
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), TEMPLATE_PREFIX + '*.blend')):
+        if old_path != path and not old_path.endswith('.tmp.blend'):
+            os.remove(old_path)
+
+def open_template(template_dir, work_dir, cam_rot, clear_scene):
+    # opens the current template, building and saving it first if needed;
+    # returns True if the template was already there
+    path = template_path(template_dir, work_dir)
+    if os.path.exists(path):
+        bpy.ops.wm.open_mainfile(filepath=path, load_ui=False)
+        return True
+    clear_scene()
+    build_static_content(work_dir, cam_rot)
+    save_template(path)
+    return False
@@ -0,0 +1,109 @@
+import os
+import struct
+import numpy as np
+
+# A WAV reader that memory-maps the data chunk instead of reading it, so long
+# recordings are only paged in where they are looked at. Supports 16, 24 and
+# 32 bit PCM and 32/64 bit float, with any number of channels (also in the
+# WAVE_FORMAT_EXTENSIBLE header). All views below share the mapped memory.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+SAMPLE_TYPES = {
+    (WAVE_FORMAT_PCM, 2): '<i2',
+    (WAVE_FORMAT_PCM, 3): None, # no 24 bit numpy type, see channel()
+    (WAVE_FORMAT_PCM, 4): '<i4',
+    (WAVE_FORMAT_IEEE_FLOAT, 4): '<f4',
+    (WAVE_FORMAT_IEEE_FLOAT, 8): '<f8',
+}
+
+class WavFile:
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave != b'WAVE':
+                raise ValueError('{} is not a WAV file'.format(self.path))
+            fmt = None
+            data_offset = data_size = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                start = f.tell()
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                elif chunk_id == b'data':
+                    data_offset, data_size = start, chunk_size
+                    break
+                # chunks are padded to an even size
+                f.seek(start + chunk_size + chunk_size % 2)
+        if fmt is None or data_offset is None:
+            raise ValueError('{} has no fmt or data chunk'.format(self.path))
+
+        audio_format, self.channels, self.rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+        if audio_format == WAVE_FORMAT_EXTENSIBLE:
+            # the format is the first two bytes of the sub format GUID
+            audio_format, = struct.unpack('<H', fmt[24:26])
+        self.format = audio_format
+        self.sample_width = bits // 8
+        if (audio_format, self.sample_width) not in SAMPLE_TYPES:
+            raise ValueError('{}: {} bit samples of format {} are not supported'.format(self.path, bits, audio_format))
+        self.frame_size = self.channels * self.sample_width
+
+        # a data chunk can claim more than was written (streams cut off while recording)
+        data_size = min(data_size, os.path.getsize(self.path) - data_offset)
+        self.nframes = data_size // self.frame_size
+        if self.nframes:
+            self.data = np.memmap(self.path, dtype=np.uint8, mode='r', offset=data_offset, shape=(self.nframes * self.frame_size,))
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    @property
+    def duration(self):
+        return self.nframes / self.rate
+
+    @property
+    def frames(self):
+        # (frames, channels, bytes per sample) view of the raw bytes
+        return self.data.reshape(self.nframes, self.channels, self.sample_width)
+
+    @property
+    def samples(self):
+        # (frames, channels) view in the file's own sample type, not available for 24 bit
+        dtype = SAMPLE_TYPES[(self.format, self.sample_width)]
+        if dtype is None:
+            raise ValueError('24 bit samples have no numpy type, use channel() or int16()')
+        return self.data.view(dtype).reshape(self.nframes, self.channels)
+
+    def channel(self, index=0):
+        # one channel as numbers: a view, except for 24 bit samples, which are decoded to int32
+        if self.sample_width == 3:
+            frames = self.frames[:, index, :].astype(np.int32)
+            values = frames[:, 0] | (frames[:, 1] << 8) | (frames[:, 2] << 16)
+            return np.where(values >= 1 << 23, values - (1 << 24), values)
+        return self.samples[:, index]
+
+    def int16(self, index=0):
+        # one channel on the 16 bit scale: for PCM a view of the two most
+        # significant bytes of every sample (the samples themselves for 16 bit),
+        # float samples are converted
+        if self.format == WAVE_FORMAT_IEEE_FLOAT:
+            return np.clip(np.floor(self.channel(index) * 32768), -32768, 32767).astype(np.int16)
+        if not self.nframes:
+            return np.zeros(0, dtype=np.int16)
+        return np.ndarray(
+            shape=(self.nframes,),
+            dtype='<i2',
+            buffer=self.data,
+            offset=index * self.sample_width + self.sample_width - 2,
+            strides=(self.frame_size,),
+        )
+
+    def normalized(self, index=0):
+        # one channel as float in [-1, 1)
+        if self.format == WAVE_FORMAT_IEEE_FLOAT:
+            return self.channel(index)
+        return self.channel(index) / float(1 << (8 * self.sample_width - 1))
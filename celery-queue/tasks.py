@@ -6,165 +6,424 @@
 
 
 import os
-from celery import Celery
+from celery import Celery, chord
+from celery.signals import task_failure, task_postrun, task_prerun, task_revoked, task_success, worker_process_shutdown
 import subprocess
 from celery.utils.log import get_task_logger
-import requests
+from kombu import Queue
+import redis
 import tempfile
-from pyvirtualdisplay import Display
-from bvh import Bvh
+import zipfile
 import time
 import ffmpeg
 from pathlib import Path
-
-Display().start()
+from contextlib import ExitStack
+from uuid import uuid4
+from render_server import RenderServer, RenderServerError
+from shared.bvh_validation import BvhValidationError, BvhValidator
+from shared.file_registry import FileRegistry
+from shared.lanes import SHORT_LANE, lane_weights_from_env
+from shared.progress import ProgressPublisher, ProgressReporter
+from shared.queue_index import QueueIndex
+from shared.storage import storage_from_env
+from worker_slot import WorkerSlot, current_slot_index
 
 
 logger = get_task_logger(__name__)
 
 
 WORKER_TIMEOUT = int(os.environ["WORKER_TIMEOUT"])
+BLENDER_BINARY = "/blender/blender-2.83.0-linux64/blender"
+RENDER_SCRIPT = "blender_render.py"
+# jobs per warm Blender process (0 starts a new Blender for every job) and its memory limit in MiB
+BLENDER_SERVER_MAX_JOBS = int(os.environ.get("BLENDER_SERVER_MAX_JOBS", 0))
+BLENDER_SERVER_MAX_RSS = int(os.environ.get("BLENDER_SERVER_MAX_RSS", 0)) * 1024 * 1024
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 1))
+# binds the Blender processes of every worker process to its own share of the cpus
+WORKER_PIN_CPUS = os.environ.get("WORKER_PIN_CPUS", "1") == "1"
+# "pipe" streams the rendered frames into a separate ffmpeg encoder configured by the ENCODER_* variables
+RENDER_ENCODER = os.environ.get("RENDER_ENCODER", "blender")
+# progress updates are passed on at most every PROGRESS_MIN_INTERVAL seconds and PROGRESS_MIN_DELTA frames
+PROGRESS_MIN_INTERVAL = float(os.environ.get("PROGRESS_MIN_INTERVAL", 1.0))
+PROGRESS_MIN_DELTA = int(os.environ.get("PROGRESS_MIN_DELTA", 1))
+# keyframe interval of the rendered videos, shards start on a keyframe so they can be joined without re-encoding
+RENDER_GOP_SIZE = 30
+# frames per shard of a sharded render (rounded down to whole GOPs), 0 renders every job in one piece
+RENDER_SHARD_FRAMES = int(os.environ.get("RENDER_SHARD_FRAMES", 0)) // RENDER_GOP_SIZE * RENDER_GOP_SIZE
+
 celery = Celery(
 	"tasks",
 	broker=os.environ["CELERY_BROKER_URL"],
 	backend=os.environ["CELERY_RESULT_BACKEND"],
 )
+# the worker consumes the lanes listed in WORKER_LANES, polled in proportion to their weights
+celery.conf.task_queues = [Queue(lane) for lane in lane_weights_from_env()]
+celery.conf.task_default_queue = SHORT_LANE
+celery.conf.broker_transport_options = {"queue_order_strategy": "shared.lanes.WeightedCycle"}
+celery.conf.worker_prefetch_multiplier = 1
+celery.conf.worker_concurrency = WORKER_CONCURRENCY
+
+redis_client = redis.StrictRedis.from_url(os.environ["REDIS_URL"])
+queue_index = QueueIndex(redis_client)
+progress = ProgressPublisher(redis_client)
+storage = storage_from_env()
+file_registry = FileRegistry(
+	redis_client,
+	storage,
+	int(os.environ.get("TMP_FILE_RETENTION", 24 * 60 * 60)),
+	int(os.environ.get("TMP_FOLDER_MAX_BYTES", 0)),
+)
+
+# created lazily, so every worker process (concurrency slot) gets its own,
+# and processes that never render (the monitor) start no X server
+worker_slot = None
+render_server = None
 
 class TaskFailure(Exception):
 	pass
 
 
-def validate_bvh_file(bvh_file):
-	MAX_NUMBER_FRAMES = int(os.environ["MAX_NUMBER_FRAMES"])
-	FRAME_TIME = 1.0 / float(os.environ["RENDER_FPS"])
-	FRAME_EPSILON = 0.00001
+def get_worker_slot() -> WorkerSlot:
+	global worker_slot
+	if worker_slot is None:
+		worker_slot = WorkerSlot(current_slot_index(), WORKER_CONCURRENCY, WORKER_PIN_CPUS)
+	return worker_slot
 
-	file_content = bvh_file.decode("utf-8")
-	mocap = Bvh(file_content)
-	counter = None
-	for line in file_content.split("\n"):
-		if counter is not None and line.strip():
-			counter += 1
-		if line.strip() == "MOTION":
-			counter = -2
 
-	if mocap.nframes != counter:
-		raise TaskFailure(
-			f"The number of rows with motion data ({counter}) does not match the Frames field ({mocap.nframes})"
-		)
+def get_render_server() -> RenderServer:
+	global render_server
+	if render_server is None:
+		slot = get_worker_slot()
+		render_server = RenderServer(BLENDER_BINARY, BLENDER_SERVER_MAX_JOBS, BLENDER_SERVER_MAX_RSS, slot.blender_args(), slot.popen_kwargs)
+	return render_server
 
-	if MAX_NUMBER_FRAMES != -1 and mocap.nframes > MAX_NUMBER_FRAMES:
-		raise TaskFailure(
-			f"The supplied number of frames ({mocap.nframes}) is bigger than {MAX_NUMBER_FRAMES}"
-		)
 
-	if mocap.frame_time < FRAME_TIME - FRAME_EPSILON or mocap.frame_time > FRAME_TIME + FRAME_EPSILON:
-		raise TaskFailure(
-			f"The supplied frame time ({mocap.frame_time}) differs from the required {FRAME_TIME} (+/- {FRAME_EPSILON})"
-		)
+@worker_process_shutdown.connect
+def release_worker_slot(**kwargs):
+	if render_server is not None:
+		render_server.stop()
+	if worker_slot is not None:
+		worker_slot.stop()
+
+
+@task_prerun.connect
+def mark_task_started(task_id=None, **kwargs):
+	queue_index.start(task_id)
+
+
+@task_postrun.connect
+def mark_task_finished(task_id=None, **kwargs):
+	queue_index.finish(task_id)
+
+
+@task_revoked.connect
+def mark_task_revoked(request=None, **kwargs):
+	# a job revoked before it started never runs the prerun signal
+	queue_index.finish(request.id)
+
+
+@task_success.connect
+def publish_task_success(sender=None, result=None, **kwargs):
+	progress.publish(sender.request.id, "SUCCESS", result)
 
-@celery.task(name="tasks.render", bind=True, hard_time_limit=WORKER_TIMEOUT)
-def render(self, bvh_file_uri: str, audio_file_uri: str, rotate_flag: str, visualization_mode: str) -> str:
-	HEADERS = {"Authorization": f"Bearer " + os.environ["SYSTEM_TOKEN"]}
-	API_SERVER = os.environ["API_SERVER"]
 
+@task_failure.connect
+def publish_task_failure(task_id=None, exception=None, **kwargs):
+	progress.publish(task_id, "FAILURE", str(exception))
+
+
+def report_state(task, state, meta=None, task_id=None):
+	task_id = task_id or task.request.id
+	task.update_state(task_id=task_id, state=state, meta=meta)
+	progress.publish(task_id, state, meta)
+
+
+def validate_bvh_file(bvh_file: Path):
+	# the API already validated the upload while streaming it, this re-check
+	# reads the file once in chunks and never holds all of it in memory
+	validator = BvhValidator.from_env()
+	try:
+		with open(bvh_file, "rb") as f:
+			for chunk in iter(lambda: f.read(1024 * 1024), b""):
+				validator.feed(chunk)
+		return validator.finish()
+	except BvhValidationError as e:
+		raise TaskFailure(str(e))
+
+
+def shard_frame_ranges(nframes: int) -> list:
+	# (first, last) frames of every shard; the unsharded render covers the frames
+	# 0 to min(RENDER_DURATION_FRAMES, nframes), both included
+	duration = int(os.environ["RENDER_DURATION_FRAMES"])
+	last = nframes if duration < 0 else min(duration, nframes)
+	if RENDER_SHARD_FRAMES <= 0:
+		return [(0, last)]
+	ranges = [[start, min(start + RENDER_SHARD_FRAMES, last + 1) - 1] for start in range(0, last + 1, RENDER_SHARD_FRAMES)]
+	# a short tail goes to the previous shard, a one frame shard can not be expressed as a duration
+	if len(ranges) > 1 and ranges[-1][1] - ranges[-1][0] + 1 < RENDER_GOP_SIZE:
+		tail = ranges.pop()
+		ranges[-1][1] = tail[1]
+	return [tuple(frame_range) for frame_range in ranges]
+
+
+def shard_progress_key(task_id: str) -> str:
+	return f"shards:{task_id}"
+
+
+def store_video(output_file) -> str:
+	video_file_key = f"{uuid4()}.mp4"
+	video_file_size = os.path.getsize(output_file)
+	storage.put_file(video_file_key, Path(output_file))
+	file_registry.register(video_file_key, video_file_size)
+	return video_file_key
+
+
+def shard_render(task, bvh_file_key: str, audio_file_key: str, rotate_flag: str, visualization_mode: str, frame_ranges: list):
+	# the shards stay in the lane of the job they were split from
+	lane = (task.request.delivery_info or {}).get("routing_key") or SHORT_LANE
+	total = frame_ranges[-1][1] - frame_ranges[0][0] + 1
+	header = [
+		render_chunk.s(bvh_file_key, rotate_flag, visualization_mode, first, last - first, task.request.id, total).set(queue=lane)
+		for first, last in frame_ranges
+	]
+	return chord(header, concat_chunks.s(bvh_file_key, audio_file_key).set(queue=lane))
+
+@celery.task(name="tasks.render", bind=True, hard_time_limit=WORKER_TIMEOUT)
+def render(self, bvh_file_key: str, audio_file_key: str, rotate_flag: str, visualization_mode: str) -> str:
 	logger.info("rendering..")
-	self.update_state(state="PROCESSING")
+	report_state(self, "PROCESSING")
+
+	with ExitStack() as inputs:
+		# inputs are read straight from the storage, the API only passes their keys
+		bvh_file = inputs.enter_context(storage.open_local(bvh_file_key))
+		audio_file = inputs.enter_context(storage.open_local(audio_file_key)) if audio_file_key is not None else None
+		frame_ranges = shard_frame_ranges(validate_bvh_file(bvh_file))
+		if len(frame_ranges) > 1:
+			# raises Ignore, concat_chunks takes over the id of this task
+			self.replace(shard_render(self, bvh_file_key, audio_file_key, rotate_flag, visualization_mode, frame_ranges))
+		output_file = render_files(self, bvh_file, audio_file, rotate_flag, visualization_mode)
+
+	# the inputs are not needed anymore
+	for file_key in [bvh_file_key, audio_file_key]:
+		if file_key is not None:
+			file_registry.remove(file_key)
 
-	audio_file = requests.get(API_SERVER + audio_file_uri, headers=HEADERS).content if audio_file_uri is not None else None
-	bvh_file = requests.get(API_SERVER + bvh_file_uri, headers=HEADERS).content
-	validate_bvh_file(bvh_file)
+	return f"/files/{store_video(output_file)}"
+
+
+@celery.task(name="tasks.render_chunk", bind=True, hard_time_limit=WORKER_TIMEOUT)
+def render_chunk(self, bvh_file_key: str, rotate_flag: str, visualization_mode: str, start: int, duration: int, parent_id: str, total: int) -> str:
+	# renders the frames start to start + duration (both included) of a sharded render
+	progress_key = shard_progress_key(parent_id)
+
+	def report_progress(meta):
+		# the shards render in parallel, so their frame rates add up
+		pipe = redis_client.pipeline()
+		pipe.hset(progress_key, start, meta["current"] + 1)
+		pipe.hset(progress_key + ":fps", start, meta["fps"] or 0)
+		pipe.expire(progress_key, WORKER_TIMEOUT)
+		pipe.expire(progress_key + ":fps", WORKER_TIMEOUT)
+		pipe.hvals(progress_key)
+		pipe.hvals(progress_key + ":fps")
+		*_, done, rates = pipe.execute()
+		current = sum(int(frames) for frames in done)
+		fps = sum(float(rate) for rate in rates)
+		eta = round(max(total - current, 0) / fps, 1) if fps else None
+		report_state(self, "RENDERING", {"current": current, "total": total, "fps": round(fps, 2) or None, "eta": eta}, task_id=parent_id)
+
+	with storage.open_local(bvh_file_key) as bvh_file:
+		output_file = render_files(self, bvh_file, None, rotate_flag, visualization_mode, start, duration, report_progress)
+	return store_video(output_file)
+
+
+@celery.task(name="tasks.concat_chunks", bind=True, hard_time_limit=WORKER_TIMEOUT)
+def concat_chunks(self, chunk_keys: list, bvh_file_key: str, audio_file_key: str) -> str:
+	# chord callback of a sharded render, joins the shards without re-encoding;
+	# reported as PROCESSING, clients only know the states of an unsharded render
+	report_state(self, "PROCESSING")
+	redis_client.delete(shard_progress_key(self.request.id), shard_progress_key(self.request.id) + ":fps")
+	with ExitStack() as inputs, tempfile.TemporaryDirectory() as tmp_dir:
+		chunk_files = [inputs.enter_context(storage.open_local(chunk_key)) for chunk_key in chunk_keys]
+		output_file = os.path.join(tmp_dir, "video.mp4")
+		concat_videos(chunk_files, output_file, os.path.join(tmp_dir, "chunks.txt"))
+		if audio_file_key is not None:
+			audio_file = inputs.enter_context(storage.open_local(audio_file_key))
+			output_file = mux_audio(self, output_file, str(audio_file), os.path.join(tmp_dir, "combined_av.mp4"))
+		video_file_key = store_video(output_file)
+
+	for file_key in [bvh_file_key, audio_file_key] + chunk_keys:
+		if file_key is not None:
+			file_registry.remove(file_key)
+	return f"/files/{video_file_key}"
+
+
+@celery.task(name="tasks.archive_batch", bind=True, hard_time_limit=WORKER_TIMEOUT)
+def archive_batch(self, results: list, names: list, cached_items: list, batch_id: str) -> str:
+	# chord callback of /render_batch, packs the videos of all clips into one archive
+	report_state(self, "PROCESSING")
+	archive_key = f"{batch_id}.zip"
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		archive_file = Path(tmp_dir) / archive_key
+		# the videos are already compressed, so they are only stored
+		with zipfile.ZipFile(str(archive_file), "w", compression=zipfile.ZIP_STORED) as archive:
+			for name, video_uri in list(zip(names, results)) + cached_items:
+				with storage.open_local(os.path.basename(video_uri)) as video_file:
+					archive.write(str(video_file), f"{name}.mp4")
+		archive_size = archive_file.stat().st_size
+		storage.put_file(archive_key, archive_file)
+	file_registry.register(archive_key, archive_size)
+	return f"/files/{archive_key}"
+
+
+def concat_videos(video_files: list, output_file: str, list_file: str):
+	# FFMPEG CMD ARGS --> ["ffmpeg", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_file]
+	with open(list_file, "w") as f:
+		for video_file in video_files:
+			f.write("file '{}'\n".format(str(video_file).replace("'", "'\\''")))
+	try:
+		ffmpeg.input(list_file, format="concat", safe=0).output(output_file, c="copy").overwrite_output().run(capture_stdout=True, capture_stderr=True)
+	except ffmpeg.Error as e:
+		raise TaskFailure(e.stderr.decode("utf-8"))
+
+
+def start_audio_encoder(audio_file: str, output_file: str):
+	# FFMPEG CMD ARGS --> ["ffmpeg", "-i", audio_file, "-vn", "-c:a", "aac", output_file]
+	if ".wav" not in audio_file:
+		raise TaskFailure("Only WAV audio stream is currently supported!")
+	return ffmpeg.input(audio_file).output(output_file, vn=None, acodec='aac').global_args('-loglevel', 'error').overwrite_output().run_async(pipe_stderr=True)
+
+
+def mux_audio(task, video_file, audio_file, output_file, acodec='aac'):
+	if ".mp4" not in video_file:
+		raise TaskFailure("Only MP4 video stream is currently supported!")
+	if acodec != 'copy' and ".wav" not in audio_file:
+		raise TaskFailure("Only WAV audio stream is currently supported!")
 	
-	def call_blender_process(script_args):
+	report_state(task, "COMBINING A/V")
+
+	# FFMPEG CMD ARGS --> ["ffmpeg", "-i", video_file, "-i", audio_file, "-c:v", "copy", "-c:a", "aac", "-map", "0:v:0", "-map", "1:a:0", "-shortest", output_file]
+	
+	v_stream = ffmpeg.input(video_file)['v']
+	a_stream = ffmpeg.input(audio_file)['a']
+	output_ffmpeg = ffmpeg.output(v_stream, a_stream, output_file, vcodec='copy', acodec=acodec, **{'shortest': None, 'y': None})
+	ffmpeg_result = ffmpeg.run(output_ffmpeg, capture_stdout=True, capture_stderr=True)
+	if ffmpeg_result[0] != b'':
+		print("FFMPEG ERROR")
+		raise TaskFailure(ffmpeg_result[0].decode("utf-8"))
+	return output_file
+
+
+def render_files(task, bvh_file: Path, audio_file: Path, rotate_flag: str, visualization_mode: str, start: int = 0, duration: int = None, report_progress=None) -> str:
+	if report_progress is None:
+		def report_progress(meta):
+			report_state(task, "RENDERING", meta)
+
+	def cold_blender_lines(script_args):
+		slot = get_worker_slot()
 		process = subprocess.Popen(
 			[
-				"/blender/blender-2.83.0-linux64/blender",
+				BLENDER_BINARY,
 				"-b",
+			] + slot.blender_args() + [
 				"--python",
-				"blender_render.py",
+				RENDER_SCRIPT,
 				"--",
 			] + script_args,
 			stdout=subprocess.PIPE,
 			stderr=subprocess.PIPE,
+			**slot.popen_kwargs(),
 		)
-		
-		total = None
-		current_frame = None
 		for line in process.stdout:
+			yield line.decode("utf-8").strip()
+		if process.wait() != 0:
+			raise TaskFailure(process.stderr.read().decode("utf-8"))
+
+	def warm_blender_lines(script_args):
+		try:
+			yield from get_render_server().run(RENDER_SCRIPT, script_args)
+		except RenderServerError as e:
+			raise TaskFailure(str(e))
+
+	def call_blender_process(script_args):
+		if BLENDER_SERVER_MAX_JOBS > 0:
+			lines = warm_blender_lines(script_args)
+		else:
+			lines = cold_blender_lines(script_args)
+
+		total = None
+		file_name = None
+		reporter = ProgressReporter(report_progress, PROGRESS_MIN_INTERVAL, PROGRESS_MIN_DELTA)
+		# the output is read to the end, so a warm Blender process is ready for the next job
+		for line in lines:
 			#print(line) # debug process prints
-			line = line.decode("utf-8").strip()
 			if line.startswith("total_frames "):
 				_, total = line.split(" ")
 				total = int(float(total))
 			elif line.startswith("Append frame "):
 				*_, current_frame = line.split(" ")
 				current_frame = int(current_frame)
+				if total:
+					# total_frames is the frame count after start, the frame numbers are absolute
+					reporter.update(current_frame - start, total)
 			elif line.startswith("output_file"):
 				_, file_name = line.split(" ")
-				return file_name
-			if total and current_frame:
-				self.update_state(
-					state="RENDERING", meta={"current": current_frame, "total": total}
-				)
-		if process.returncode != 0:
-			raise TaskFailure(process.stderr.read().decode("utf-8"))
+		return file_name
 	
-	def call_ffmpeg_process(video_file, audio_file, output_file):
-		if ".mp4" not in video_file:
-			raise TaskFailure("Only MP4 video stream is currently supported!")
-		if ".wav" not in audio_file:
-			raise TaskFailure("Only WAV audio stream is currently supported!")
-		
-		self.update_state(
-			state="COMBINING A/V"
-		)
 
-		# FFMPEG CMD ARGS --> ["ffmpeg", "-i", video_file, "-i", audio_file, "-c:v", "copy", "-c:a", "aac", "-map", "0:v:0", "-map", "1:a:0", "-shortest", output_file]
-		
-		v_stream = ffmpeg.input(video_file)['v']
-		a_stream = ffmpeg.input(audio_file)['a']
-		output_ffmpeg = ffmpeg.output(v_stream, a_stream, output_file, vcodec='copy', acodec='aac', **{'shortest': None, 'y': None})
-		ffmpeg_result = ffmpeg.run(output_ffmpeg, capture_stdout=True, capture_stderr=True)
-		if ffmpeg_result[0] != b'':
-			print("FFMPEG ERROR")
-			raise TaskFailure(ffmpeg_result[0].decode("utf-8"))
-		return output_file
-		
-	
 	output_file = None
 	output_dir = Path(tempfile.mkdtemp()) / "video"
-	with tempfile.NamedTemporaryFile(suffix=".bvh") as tmp_bvh:
-		tmp_bvh.write(bvh_file)
-		tmp_bvh.seek(0)
-		script_args = []
-		script_args.append('--input')
-		script_args.append(tmp_bvh.name)
-		script_args.append('--duration')
-		script_args.append(os.environ["RENDER_DURATION_FRAMES"])
-		script_args.append('--video')
-		script_args.append('--res_x')
-		script_args.append(os.environ["RENDER_RESOLUTION_X"])
-		script_args.append('--res_y')
-		script_args.append(os.environ["RENDER_RESOLUTION_Y"])
-		script_args.append('-o')
-		script_args.append(output_dir)
-		script_args.append('--visualization_mode')
-		script_args.append(visualization_mode)
-		if rotate_flag is not None:
-			script_args.append('--rotate')
-			script_args.append(rotate_flag)
-		
+	script_args = []
+	script_args.append('--input')
+	script_args.append(str(bvh_file))
+	if start:
+		script_args.append('--start')
+		script_args.append(str(start))
+	script_args.append('--duration')
+	script_args.append(str(duration) if duration is not None else os.environ["RENDER_DURATION_FRAMES"])
+	script_args.append('--video')
+	script_args.append('--res_x')
+	script_args.append(os.environ["RENDER_RESOLUTION_X"])
+	script_args.append('--res_y')
+	script_args.append(os.environ["RENDER_RESOLUTION_Y"])
+	script_args.append('-o')
+	script_args.append(str(output_dir))
+	script_args.append('--visualization_mode')
+	script_args.append(visualization_mode)
+	if rotate_flag is not None:
+		script_args.append('--rotate')
+		script_args.append(rotate_flag)
+	if RENDER_ENCODER == "pipe":
+		script_args.append('--encoder')
+		script_args.append('pipe')
+		for name in ["preset", "crf", "threads", "pix_fmt"]:
+			value = os.environ.get(f"ENCODER_{name.upper()}")
+			if value:
+				script_args.append(f'--encoder_{name}')
+				script_args.append(value)
+	
+	audio_encoder = None
+	if audio_file and RENDER_ENCODER == "pipe":
+		# the piped encoder muxes the audio while it encodes the frames
+		script_args.append('--input_audio')
+		script_args.append(str(audio_file))
+	elif audio_file:
+		# the audio is encoded while Blender renders, so muxing it afterwards only copies both streams
+		encoded_audio_file = str(output_dir.parent / "audio.m4a")
+		audio_encoder = start_audio_encoder(str(audio_file), encoded_audio_file)
+
+	try:
 		output_file = call_blender_process(script_args)
-		if audio_file:
-			with tempfile.NamedTemporaryFile(suffix=".wav") as tmp_wav:
-				tmp_wav.write(audio_file)
-				tmp_wav.seek(0)
-				output_file = call_ffmpeg_process(output_file, tmp_wav.name, os.path.join(os.path.dirname(output_file),"combined_av.mp4"))
+	finally:
+		if audio_encoder is not None:
+			_, audio_errors = audio_encoder.communicate()
+	if audio_encoder is not None and output_file is not None:
+		combined_file = os.path.join(os.path.dirname(output_file),"combined_av.mp4")
+		if audio_encoder.returncode == 0:
+			output_file = mux_audio(task, output_file, encoded_audio_file, combined_file, acodec='copy')
+		else:
+			logger.warning("encoding the audio in parallel failed, muxing it afterwards: %s", audio_errors.decode("utf-8"))
+			output_file = mux_audio(task, output_file, str(audio_file), combined_file)
 
 	if output_file is None:
 		raise TaskFailure("Something went wrong... Not sure why.")
-		
-	files = {"file": (os.path.basename(output_file), open(output_file, "rb"))}
-	return requests.post(
-		API_SERVER + "/upload_video", files=files, headers=HEADERS
-	).text
\ No newline at end of file
+	return output_file
\ No newline at end of file
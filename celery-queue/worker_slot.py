@@ -0,0 +1,63 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import os
+from typing import Dict, List, Optional
+
+from billiard import current_process
+from pyvirtualdisplay import Display
+
+
+def slot_cpus(index: int, concurrency: int, cpus: List[int]) -> List[int]:
+	# splits the cpus into concurrency disjoint sets whose sizes differ by at most one,
+	# slots beyond the number of cpus share a single cpu
+	cpus = sorted(cpus)
+	concurrency = max(concurrency, 1)
+	assigned = cpus[index * len(cpus) // concurrency:(index + 1) * len(cpus) // concurrency]
+	return assigned or [cpus[index % len(cpus)]]
+
+
+class WorkerSlot:
+	# The resources of one concurrency slot (worker process): its own virtual X
+	# server, started on first use, and when pinning, a disjoint set of cpus that
+	# the Blender processes of the slot are bound to and size their threads by.
+	def __init__(self, index: int, concurrency: int, pin_cpus: bool = True):
+		self.index = index
+		self.cpus = slot_cpus(index, concurrency, list(os.sched_getaffinity(0))) if pin_cpus else None
+		self.display: Optional[Display] = None
+
+	@property
+	def threads(self) -> int:
+		# 0 lets Blender use every core
+		return len(self.cpus) if self.cpus else 0
+
+	def env(self) -> Dict[str, str]:
+		if self.display is None:
+			self.display = Display()
+			self.display.start()
+		return dict(os.environ, DISPLAY=f":{self.display.display}")
+
+	def pin(self):
+		# preexec_fn of the slot's subprocesses, their children (ffmpeg) inherit it
+		if self.cpus:
+			os.sched_setaffinity(0, self.cpus)
+
+	def popen_kwargs(self) -> dict:
+		return {"env": self.env(), "preexec_fn": self.pin}
+
+	def blender_args(self) -> List[str]:
+		return ["-t", str(self.threads)]
+
+	def stop(self):
+		if self.display is not None:
+			display, self.display = self.display, None
+			display.stop()
+
+
+def current_slot_index() -> int:
+	# billiard numbers the pool processes 0..concurrency-1 and reuses the number of a replaced process
+	return getattr(current_process(), "index", 0) or 0
@@ -5,9 +5,9 @@
 # file that should have been included as part of this package.
 
 
+import json
 import requests
 from pathlib import Path
-import time
 
 import argparse
 
@@ -50,13 +50,17 @@ except requests.Timeout:
 print("Got response from server.")
 job_uri = render_request.text
 
-done = False
-while not done:
-	resp = requests.get(server_url + job_uri, headers=headers)
-	resp.raise_for_status()
+def job_events(job_uri):
+	# the server pushes every state change of the job as a server-sent event
+	with requests.get(server_url + job_uri + "/events", headers=headers, stream=True) as resp:
+		resp.raise_for_status()
+		for line in resp.iter_lines(decode_unicode=True):
+			if line.startswith("data: "):
+				yield json.loads(line[len("data: "):])
 
-	response = resp.json()
-	
+
+file_url = None
+for response in job_events(job_uri):
 	if response["state"] == "PENDING":
 		jobs_in_queue = response["result"]["jobs_in_queue"]
 		print(f"pending.. {jobs_in_queue} jobs currently in queue")
@@ -67,14 +71,15 @@ while not done:
 	elif response["state"] == "RENDERING":
 		current = response["result"]["current"]
 		total = response["result"]["total"]
-		print(f"Rendering BVH: {int(current/total*100)}% done ({current}/{total} frames)")
+		eta = response["result"].get("eta")
+		eta = f", about {int(eta)}s left" if eta is not None else ""
+		print(f"Rendering BVH: {int(current/total*100)}% done ({current}/{total} frames{eta})")
 
 	elif response["state"] == "COMBINING A/V":
 		print(f"Combining audio with video. Your video will be ready soon!")
 
 	elif response["state"] == "SUCCESS":
 		file_url = response["result"]
-		done = True
 		print("Done!")
 		break
 
@@ -83,8 +88,33 @@ while not done:
 	else:
 		print(response)
 		raise Exception("should not happen..")
-	time.sleep(5)
-
 
-video = requests.get(server_url + file_url, headers=headers).content
-output.write_bytes(video)
+if file_url is None:
+	raise Exception("The connection to the server was closed before the job finished.")
+
+
+def download(url, output, retries=5):
+	# resumes from the bytes already written if the connection drops
+	received = 0
+	for _ in range(retries):
+		request_headers = dict(headers)
+		if received:
+			request_headers["Range"] = f"bytes={received}-"
+		try:
+			with requests.get(url, headers=request_headers, stream=True, timeout=30) as resp:
+				resp.raise_for_status()
+				if resp.status_code != 206:
+					received = 0
+				with output.open("ab" if received else "wb") as f:
+					for chunk in resp.iter_content(chunk_size=1024 * 1024):
+						f.write(chunk)
+						received += len(chunk)
+			return
+		except (requests.ConnectionError, requests.Timeout):
+			print(f"Download interrupted after {received} bytes, resuming..")
+	raise Exception(f"Could not download {url}")
+
+
+download(server_url + file_url, output)
+# lets the server know that the video can be removed
+requests.delete(server_url + file_url, headers=headers)
@@ -0,0 +1,108 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import os
+
+FRAME_EPSILON = 0.00001
+# what is left of a motion row once the characters of decimal numbers are removed
+NUMBER_CHARS = b"0123456789+-.eE \t\r"
+
+
+class BvhValidationError(ValueError):
+	pass
+
+
+class BvhValidator:
+	# Checks a BVH file while it is being streamed, chunk by chunk. Only the
+	# CHANNELS of the hierarchy and the MOTION header fields are parsed, the
+	# motion rows are counted and checked for their number of values and for
+	# NaN/inf without converting them, so the API can reject a file before it
+	# reaches the queue and the worker can re-check it without building a full
+	# Bvh object.
+	def __init__(self, max_number_frames: int, fps: float):
+		self.max_number_frames = max_number_frames
+		self.frame_time = 1.0 / fps
+		self.pending = b""
+		self.in_motion = False
+		self.channels = 0
+		self.counter = None
+		self.nframes = None
+		self.file_frame_time = None
+
+	@classmethod
+	def from_env(cls):
+		return cls(int(os.environ["MAX_NUMBER_FRAMES"]), float(os.environ["RENDER_FPS"]))
+
+	def feed(self, chunk: bytes):
+		lines = (self.pending + chunk).split(b"\n")
+		self.pending = lines.pop()
+		for line in lines:
+			self.parse_line(line)
+
+	def parse_line(self, line: bytes):
+		line = line.strip()
+		if not self.in_motion:
+			if line == b"MOTION":
+				self.in_motion = True
+				# the Frames and Frame Time lines are not motion rows
+				self.counter = -2
+			elif line.startswith(b"CHANNELS"):
+				try:
+					self.channels += int(line.split()[1])
+				except (IndexError, ValueError):
+					raise BvhValidationError(f"The CHANNELS line ({line.decode('utf-8', 'replace')}) could not be parsed")
+			return
+		if not line:
+			return
+		self.counter += 1
+		if self.counter > 0:
+			self.check_row(line)
+		else:
+			fields = line.split()
+			try:
+				if line.startswith(b"Frames:"):
+					self.nframes = int(fields[1])
+				elif line.startswith(b"Frame Time:"):
+					self.file_frame_time = float(fields[2])
+			except (IndexError, ValueError):
+				raise BvhValidationError(f"The MOTION header line ({line.decode('utf-8', 'replace')}) could not be parsed")
+
+	def check_row(self, line: bytes):
+		values = len(line.split())
+		if values != self.channels:
+			raise BvhValidationError(
+				f"Row {self.counter} of the motion data has {values} values, but the hierarchy defines {self.channels} channels"
+			)
+		rest = line.translate(None, NUMBER_CHARS)
+		if rest:
+			rest = rest.lower()
+			if b"nan" in rest or b"inf" in rest:
+				raise BvhValidationError(f"Row {self.counter} of the motion data contains NaN or infinite values")
+			raise BvhValidationError(f"Row {self.counter} of the motion data contains values that are not numbers")
+
+	def finish(self) -> int:
+		if self.pending:
+			self.parse_line(self.pending)
+			self.pending = b""
+		if self.nframes is None or self.file_frame_time is None:
+			raise BvhValidationError("The supplied file is missing the MOTION section with the Frames and Frame Time fields")
+
+		if self.nframes != self.counter:
+			raise BvhValidationError(
+				f"The number of rows with motion data ({self.counter}) does not match the Frames field ({self.nframes})"
+			)
+
+		if self.max_number_frames != -1 and self.nframes > self.max_number_frames:
+			raise BvhValidationError(
+				f"The supplied number of frames ({self.nframes}) is bigger than {self.max_number_frames}"
+			)
+
+		if self.file_frame_time < self.frame_time - FRAME_EPSILON or self.file_frame_time > self.frame_time + FRAME_EPSILON:
+			raise BvhValidationError(
+				f"The supplied frame time ({self.file_frame_time}) differs from the required {self.frame_time} (+/- {FRAME_EPSILON})"
+			)
+		return self.nframes
@@ -0,0 +1,57 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import time
+
+
+class FileRegistry:
+	# Every object written to the storage is registered in a Redis sorted set
+	# scored by its expiry time, with its size kept alongside. Sweeping then only
+	# touches the objects that are due instead of listing the whole storage, and
+	# the size total lets the storage be capped without scanning it either.
+	def __init__(self, redis_client, storage, retention: int, max_bytes: int, prefix: str = "tmp_files"):
+		self.redis = redis_client
+		self.storage = storage
+		self.retention = retention
+		self.max_bytes = max_bytes
+		self.expiry_key = f"{prefix}:expiry"
+		self.sizes_key = f"{prefix}:sizes"
+		self.bytes_key = f"{prefix}:bytes"
+		self.lock_key = f"{prefix}:sweep_lock"
+
+	def register(self, key: str, size: int):
+		pipe = self.redis.pipeline()
+		# ZADD through execute_command, the workers still ship redis-py 2 whose zadd
+		# signature differs from the one in the API
+		pipe.execute_command("ZADD", self.expiry_key, time.time() + self.retention, key)
+		pipe.hset(self.sizes_key, key, size)
+		pipe.incrby(self.bytes_key, size)
+		pipe.execute()
+
+	def remove(self, key: str):
+		pipe = self.redis.pipeline()
+		pipe.hget(self.sizes_key, key)
+		pipe.hdel(self.sizes_key, key)
+		pipe.zrem(self.expiry_key, key)
+		size, removed, _ = pipe.execute()
+		# whoever drops the size entry owns the removal, so concurrent sweeps
+		# and acknowledgements never delete or subtract the same object twice
+		if removed:
+			self.redis.decrby(self.bytes_key, int(size))
+			self.storage.delete(key)
+
+	def acquire_sweep(self, interval: int) -> bool:
+		return bool(self.redis.set(self.lock_key, 1, nx=True, ex=interval))
+
+	def sweep(self):
+		for key in self.redis.zrangebyscore(self.expiry_key, "-inf", time.time()):
+			self.remove(key.decode("utf-8"))
+		while self.max_bytes > 0 and int(self.redis.get(self.bytes_key) or 0) > self.max_bytes:
+			oldest = self.redis.zrange(self.expiry_key, 0, 0)
+			if not oldest:
+				break
+			self.remove(oldest[0].decode("utf-8"))
@@ -0,0 +1,71 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import os
+from typing import Dict
+
+SYSTEM_LANE = "system"
+SHORT_LANE = "short"
+LONG_LANE = "long"
+LANES = [SYSTEM_LANE, SHORT_LANE, LONG_LANE]
+
+
+def estimate_cost(nframes: int, max_frames: int, has_audio: bool, audio_cost_factor: float) -> float:
+	frames = min(nframes, max_frames) if max_frames > 0 else nframes
+	return frames * (audio_cost_factor if has_audio else 1.0)
+
+
+def choose_lane(is_system: bool, cost: float, short_max_cost: float) -> str:
+	if is_system:
+		return SYSTEM_LANE
+	return SHORT_LANE if cost <= short_max_cost else LONG_LANE
+
+
+def parse_lane_weights(spec: str) -> Dict[str, int]:
+	# "system:4,short:2,long:1" -> {"system": 4, "short": 2, "long": 1}
+	weights = {}
+	for entry in spec.split(","):
+		if entry.strip():
+			lane, _, weight = entry.partition(":")
+			weights[lane.strip()] = int(weight) if weight else 1
+	return weights
+
+
+def lane_weights_from_env() -> Dict[str, int]:
+	return parse_lane_weights(os.environ.get("WORKER_LANES", "system:4,short:2,long:1"))
+
+
+class WeightedCycle:
+	# Queue order strategy for kombu's Redis transport (see the
+	# queue_order_strategy transport option). The transport BRPOPs the queues in
+	# the order returned by consume(), so the first non-empty queue wins. A smooth
+	# weighted round robin decides which lane goes first on every poll: with all
+	# lanes backed up each one is served in proportion to its weight, and no lane
+	# is starved as long as its weight is positive.
+	def __init__(self, it=None):
+		self.weights = lane_weights_from_env()
+		self.items = []
+		self.credit = {}
+		if it is not None:
+			self.update(it)
+
+	def update(self, it):
+		self.items[:] = it
+
+	def consume(self, n):
+		total = 0
+		for item in self.items:
+			weight = self.weights.get(item, 1)
+			self.credit[item] = self.credit.get(item, 0) + weight
+			total += weight
+		order = sorted(self.items, key=lambda item: -self.credit[item])
+		if order:
+			self.credit[order[0]] -= total
+		return order[:n]
+
+	def rotate(self, last_used):
+		pass
@@ -0,0 +1,66 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import json
+import time
+from collections import deque
+from typing import Optional
+
+
+def progress_channel(task_id: str) -> str:
+	return f"progress:{task_id}"
+
+
+class ProgressPublisher:
+	# Workers publish every state transition of a job on a per-task Redis
+	# pub/sub channel so the API can push it to clients as it happens.
+	def __init__(self, redis_client):
+		self.redis = redis_client
+
+	def publish(self, task_id: str, state: str, result=None):
+		self.redis.publish(progress_channel(task_id), json.dumps({"state": state, "result": result}))
+
+
+class ProgressReporter:
+	# Coalesces the per-frame progress of a render: an update is only passed on
+	# once at least min_interval seconds and min_delta frames have passed since
+	# the last one. The first and the last frame are always passed on. The frame
+	# rate is measured over the last window seconds and gives the ETA.
+	def __init__(self, report, min_interval: float = 1.0, min_delta: int = 1, window: float = 10.0, clock=time.monotonic):
+		self.report = report
+		self.min_interval = min_interval
+		self.min_delta = min_delta
+		self.window = window
+		self.clock = clock
+		self.samples = deque()
+		self.last_time = None
+		self.last_current = None
+
+	def fps(self) -> Optional[float]:
+		(first_time, first_current), (last_time, last_current) = self.samples[0], self.samples[-1]
+		if last_time <= first_time:
+			return None
+		return (last_current - first_current) / (last_time - first_time)
+
+	def update(self, current: int, total: int):
+		now = self.clock()
+		self.samples.append((now, current))
+		while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+			self.samples.popleft()
+
+		if self.last_time is not None and current < total:
+			if now - self.last_time < self.min_interval or current - self.last_current < self.min_delta:
+				return
+		self.last_time = now
+		self.last_current = current
+
+		fps = self.fps()
+		eta = None
+		if fps:
+			eta = round(max(total - current, 0) / fps, 1)
+			fps = round(fps, 2)
+		self.report({"current": current, "total": total, "fps": fps, "eta": eta})
@@ -0,0 +1,71 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import time
+from typing import Optional, Tuple
+
+POSITION_SCRIPT = """
+local lane = redis.call('HGET', KEYS[1], ARGV[1])
+if not lane then
+	return {-1, 0, ''}
+end
+local pending_key = ARGV[2] .. lane
+for _, expired in ipairs(redis.call('ZRANGEBYSCORE', pending_key, '-inf', ARGV[3])) do
+	redis.call('ZREM', pending_key, expired)
+	redis.call('HDEL', KEYS[1], expired)
+end
+local rank = redis.call('ZRANK', pending_key, ARGV[1])
+return {rank or -1, redis.call('ZCARD', pending_key), lane}
+"""
+
+REMOVE_SCRIPT = """
+local lane = redis.call('HGET', KEYS[1], ARGV[1])
+if lane then
+	redis.call('ZREM', ARGV[2] .. lane, ARGV[1])
+end
+if ARGV[3] == '1' then
+	redis.call('HDEL', KEYS[1], ARGV[1])
+end
+"""
+
+
+class QueueIndex:
+	# Jobs waiting for a worker are kept in one Redis sorted set per lane, scored
+	# by their enqueue time, with a hash mapping each job to its lane. The API
+	# adds jobs when they are sent, the workers remove them when they start (and
+	# again when they finish, in case the start was never seen), so a job's
+	# position is its rank within its lane and the lane's depth is the set size.
+	# Both are read in one round trip through a server-side script, which first
+	# drops the jobs enqueued more than max_age seconds ago: their start was
+	# never seen (revoked or lost messages), and their inputs have expired.
+	def __init__(self, redis_client, max_age: int = 24 * 60 * 60, prefix: str = "queue"):
+		self.redis = redis_client
+		self.max_age = max_age
+		self.lanes_key = f"{prefix}:lanes"
+		self.pending_prefix = f"{prefix}:pending:"
+		self.position_script = self.redis.register_script(POSITION_SCRIPT)
+		self.remove_script = self.redis.register_script(REMOVE_SCRIPT)
+
+	def enqueue(self, task_id: str, lane: str):
+		# only called from the API, which ships the redis-py 3 zadd signature
+		pipe = self.redis.pipeline()
+		pipe.hset(self.lanes_key, task_id, lane)
+		pipe.zadd(self.pending_prefix + lane, {task_id: time.time()})
+		pipe.execute()
+
+	def start(self, task_id: str):
+		self.remove_script(keys=[self.lanes_key], args=[task_id, self.pending_prefix, "0"])
+
+	def finish(self, task_id: str):
+		self.remove_script(keys=[self.lanes_key], args=[task_id, self.pending_prefix, "1"])
+
+	def position(self, task_id: str) -> Tuple[Optional[int], int, Optional[str]]:
+		cutoff = time.time() - self.max_age if self.max_age > 0 else "-inf"
+		rank, depth, lane = self.position_script(keys=[self.lanes_key], args=[task_id, self.pending_prefix, cutoff])
+		if rank < 0:
+			return None, depth, None
+		return rank + 1, depth, lane.decode("utf-8")
@@ -0,0 +1,137 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+
+class LocalStorage:
+	# Keeps objects as plain files below `root`, which the API and the workers
+	# share as a volume. Objects are moved in by rename and read in place.
+	def __init__(self, root: Path):
+		self.root = root
+		self.root.mkdir(parents=True, exist_ok=True)
+
+	def local_path(self, key: str) -> Optional[Path]:
+		return self.root / key
+
+	def url(self, key: str, expires: int = 3600) -> Optional[str]:
+		return None
+
+	def exists(self, key: str) -> bool:
+		return (self.root / key).is_file()
+
+	def size(self, key: str) -> int:
+		return (self.root / key).stat().st_size
+
+	def put_file(self, key: str, path: Path):
+		destination = self.root / key
+		destination.parent.mkdir(parents=True, exist_ok=True)
+		shutil.move(str(path), str(destination))
+
+	@contextmanager
+	def open_local(self, key: str):
+		path = self.root / key
+		if not path.is_file():
+			raise FileNotFoundError(key)
+		yield path
+
+	def copy(self, source_key: str, destination_key: str):
+		destination = self.root / destination_key
+		destination.parent.mkdir(parents=True, exist_ok=True)
+		try:
+			os.link(str(self.root / source_key), str(destination))
+		except FileExistsError:
+			pass
+		except FileNotFoundError:
+			raise
+		except OSError:
+			# filesystems without hard links
+			shutil.copyfile(str(self.root / source_key), str(destination))
+
+	def delete(self, key: str):
+		try:
+			(self.root / key).unlink()
+		except FileNotFoundError:
+			pass
+
+
+class S3Storage:
+	# Keeps objects in an S3-compatible bucket. `endpoint_url` points it at a
+	# local stand-in such as MinIO. Workers download inputs to a temporary file
+	# for the duration of a job, the API redirects downloads to presigned URLs.
+	def __init__(self, bucket: str, endpoint_url: Optional[str] = None):
+		import boto3
+		from botocore.exceptions import ClientError
+
+		self.client = boto3.client("s3", endpoint_url=endpoint_url)
+		self.client_error = ClientError
+		self.bucket = bucket
+
+	def local_path(self, key: str) -> Optional[Path]:
+		return None
+
+	def url(self, key: str, expires: int = 3600) -> Optional[str]:
+		return self.client.generate_presigned_url("get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires)
+
+	def head(self, key: str) -> dict:
+		try:
+			return self.client.head_object(Bucket=self.bucket, Key=key)
+		except self.client_error as e:
+			if e.response["Error"]["Code"] in ["404", "NoSuchKey"]:
+				raise FileNotFoundError(key)
+			raise
+
+	def exists(self, key: str) -> bool:
+		try:
+			self.head(key)
+		except FileNotFoundError:
+			return False
+		return True
+
+	def size(self, key: str) -> int:
+		return self.head(key)["ContentLength"]
+
+	def put_file(self, key: str, path: Path):
+		self.client.upload_file(str(path), self.bucket, key)
+		os.unlink(str(path))
+
+	@contextmanager
+	def open_local(self, key: str):
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			path = Path(tmp_dir) / os.path.basename(key)
+			try:
+				self.client.download_file(self.bucket, key, str(path))
+			except self.client_error as e:
+				if e.response["Error"]["Code"] in ["404", "NoSuchKey"]:
+					raise FileNotFoundError(key)
+				raise
+			yield path
+
+	def copy(self, source_key: str, destination_key: str):
+		try:
+			self.client.copy_object(Bucket=self.bucket, Key=destination_key, CopySource={"Bucket": self.bucket, "Key": source_key})
+		except self.client_error as e:
+			if e.response["Error"]["Code"] in ["404", "NoSuchKey"]:
+				raise FileNotFoundError(source_key)
+			raise
+
+	def delete(self, key: str):
+		self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+def storage_from_env():
+	backend = os.environ.get("STORAGE_BACKEND", "local")
+	if backend == "local":
+		return LocalStorage(Path(os.environ.get("STORAGE_ROOT", "/data/genea_visualizer")))
+	elif backend == "s3":
+		return S3Storage(os.environ["STORAGE_S3_BUCKET"], os.environ.get("STORAGE_S3_ENDPOINT_URL") or None)
+	raise NotImplementedError(f"The storage backend {backend} is not supported")
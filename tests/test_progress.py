@@ -0,0 +1,50 @@
+# Copyright 2020 by Patrik Jonell.
+# All rights reserved.
+# This file is part of the GENEA visualizer,
+# and is released under the GPLv3 License. Please see the LICENSE
+# file that should have been included as part of this package.
+
+
+from shared.progress import ProgressReporter
+
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def render_shard(start, duration, min_interval, min_delta, frame_seconds=0.1):
+	# feeds the reporter like call_blender_process does for a shard: the
+	# "Append frame" numbers are absolute, total_frames is the duration
+	clock = FakeClock()
+	reports = []
+	reporter = ProgressReporter(reports.append, min_interval, min_delta, clock=clock)
+	for frame in range(start, start + duration + 1):
+		clock.now += frame_seconds
+		reporter.update(frame - start, duration)
+	return reports
+
+
+def test_shard_with_start_is_throttled():
+	reports = render_shard(start=300, duration=299, min_interval=1.0, min_delta=1)
+	# 300 frames at 10 fps over 30 s, about one report per second
+	assert 25 <= len(reports) <= 35
+	assert reports[0]["current"] == 0
+	assert reports[-1]["current"] == reports[-1]["total"] == 299
+	assert reports[-1]["eta"] == 0
+
+
+def test_min_delta_coalesces_fast_frames():
+	reports = render_shard(start=600, duration=299, min_interval=0.0, min_delta=50, frame_seconds=0.01)
+	assert [report["current"] for report in reports] == [0, 50, 100, 150, 200, 250, 299]
+
+
+def test_fps_and_eta():
+	reports = render_shard(start=30, duration=99, min_interval=1.0, min_delta=1)
+	assert reports[0]["fps"] is None and reports[0]["eta"] is None
+	middle = reports[len(reports) // 2]
+	assert abs(middle["fps"] - 10) < 0.01
+	assert abs(middle["eta"] - (99 - middle["current"]) / 10) < 0.1